@@ -0,0 +1,154 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+"""
+Times parsing of a synthetic 20-record, 84-attribute collection batch
+in every serialization version:
+
+    python benchmarks/parse_typedobject.py [SRC ...]
+
+Every SRC is a source tree (src directory of a dctmpy checkout) the
+benchmark is run against, so the current tokenizer is compared with an
+earlier one by passing both trees, e.g. src and src of a checkout made
+with git worktree add. Defaults to src next to this script. Trees
+which do not know an option of a variant (validate, lazy) just ignore
+it.
+"""
+import os
+import random
+import subprocess
+import sys
+import timeit
+
+ROWS = 20
+ATTRS = 84
+REPEAT = 5
+NUMBER = 20
+
+TYPES = ['STRING', 'INT', 'ID', 'TIME', 'BOOL', 'DOUBLE']
+TYPE_NUMBERS = {'BOOL': 0, 'INT': 1, 'STRING': 2, 'ID': 3, 'TIME': 4, 'DOUBLE': 5}
+
+
+def attributes():
+    result = [('r_object_id', 'ID', False)]
+    for i in xrange(1, ATTRS):
+        result.append(('attr_%d' % i, TYPES[i % len(TYPES)], i % 7 == 3))
+    return result
+
+
+def value(attr_type, ser_version):
+    if attr_type == 'STRING':
+        string = random.choice(['dmadmin', '', 'hello world', ' leading space', 'x' * 40])
+        return "A %d %s" % (len(string), string)
+    if attr_type == 'INT':
+        return str(random.randint(-5, 100000))
+    if attr_type == 'ID':
+        return "09%014x" % random.randint(0, 1 << 40)
+    if attr_type == 'TIME':
+        if ser_version == 2:
+            return random.choice(['nulldate', '2013-05-%02dT10:11:12Z' % random.randint(1, 28)])
+        return random.choice(['nulldate', 'xxx Jan 01 00:00:00 2013'])
+    if attr_type == 'BOOL':
+        return random.choice('TF')
+    return random.choice(['0', '1.5', '123456789', '-2.25'])
+
+
+def record(ser_version, int_to_pseudo_base64):
+    lines = ["OBJ dm_document" + ["", " 0 0 0"][ser_version > 0], str(ATTRS)]
+    for (position, (name, attr_type, repeating)) in enumerate(attributes()):
+        if ser_version == 2:
+            lines.append("%s %s %d" % (int_to_pseudo_base64(position), ["S", "R"][repeating],
+                                       TYPE_NUMBERS[attr_type]))
+        elif ser_version == 1:
+            lines.append(int_to_pseudo_base64(position))
+        if repeating:
+            count = random.randint(0, 3)
+            lines.append(str(count))
+            lines.extend(value(attr_type, ser_version) for i in xrange(count))
+        else:
+            lines.append(value(attr_type, ser_version))
+    lines.append("0")
+    if ser_version > 0:
+        lines.append("0")
+    return "\n".join(lines) + "\n"
+
+
+def batch(ser_version, int_to_pseudo_base64):
+    data = "".join(record(ser_version, int_to_pseudo_base64) for i in xrange(ROWS))
+    if ser_version > 0:
+        data = "%d\n" % ser_version + data
+    return buffer(data)
+
+
+class Batch(object):
+    def __init__(self, data):
+        self.data = data
+        self.pieces = [data]
+        self.length = len(data)
+        self.record_count = ROWS
+        self.may_be_more = False
+
+
+class Session(object):
+    def __init__(self, data, ser_version, **kwargs):
+        self.data = data
+        self.ser_version = ser_version
+        self.iso8601time = ser_version == 2
+        self.__dict__.update(kwargs)
+
+    def next_batch(self, collection, batch_hint, *args):
+        return Batch(self.data)
+
+    def close_collection(self, collection):
+        pass
+
+
+def run(src):
+    sys.path.insert(0, src)
+    from dctmpy import int_to_pseudo_base64
+    from dctmpy.obj.attrinfo import AttrInfo
+    from dctmpy.obj.collection import Collection
+    from dctmpy.obj.typeinfo import TypeInfo
+
+    for ser_version in (0, 1, 2):
+        random.seed(1)
+        type_info = TypeInfo(name='dm_document', id='0', vstamp=0, version=0, cache=0, super='NULL',
+                             ser_version=ser_version)
+        for (position, (name, attr_type, repeating)) in enumerate(attributes()):
+            type_info.append(AttrInfo(position=position, name=name, type=attr_type, repeating=repeating,
+                                      length=32, restriction=0))
+        data = batch(ser_version, int_to_pseudo_base64)
+        variants = [('default', {}), ('validate=False', {'validate': False})]
+        if ser_version == 2:
+            variants.append(('lazy', {'lazy': True}))
+
+        for (name, options) in variants:
+            session = Session(data, ser_version, **options)
+
+            def parse():
+                collection = Collection(session=session, type=type_info, collection=1, batch_size=ROWS,
+                                        persistent=False)
+                records = 0
+                while collection.next_record() is not None:
+                    records += 1
+                assert records == ROWS
+
+            best = min(timeit.repeat(parse, repeat=REPEAT, number=NUMBER)) / NUMBER
+            print "ser_version %d %-15s %8.2f ms per batch" % (ser_version, name, best * 1000)
+
+
+def main(args):
+    if len(args) > 1 and args[0] == '--run':
+        run(args[1])
+        return
+    if not args:
+        args = [os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')]
+    for src in args:
+        print os.path.abspath(src)
+        sys.stdout.flush()
+        subprocess.check_call([sys.executable, os.path.abspath(__file__), '--run', os.path.abspath(src)])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
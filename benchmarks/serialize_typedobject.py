@@ -0,0 +1,78 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+"""
+Times TypedObject.serialize() of objects with 10000-value repeating
+attributes and of a typical RPC argument object:
+
+    python benchmarks/serialize_typedobject.py [SRC ...]
+
+SRC is handled as in parse_typedobject.py: the benchmark runs against
+every source tree given, src next to this script by default.
+"""
+import os
+import subprocess
+import sys
+import timeit
+
+VALUES = 10000
+REPEAT = 5
+
+
+class Session(object):
+    ser_version = 2
+    iso8601time = True
+
+
+def repeating(TypedObject, name):
+    obj = TypedObject(session=Session())
+    if name == 'STRING':
+        obj.append_string('values', ["value %d" % x for x in xrange(VALUES)])
+    elif name == 'INT':
+        obj.append_int('values', range(VALUES))
+    elif name == 'ID':
+        obj.append_id('values', ["09%014x" % x for x in xrange(VALUES)])
+    elif name == 'BOOL':
+        obj.append_bool('values', [x % 2 == 0 for x in xrange(VALUES)])
+    elif name == 'DOUBLE':
+        obj.append_double('values', [x / 3.0 for x in xrange(VALUES)])
+    return obj
+
+
+def request(TypedObject):
+    obj = TypedObject(session=Session())
+    obj.set_string("QUERY", "select r_object_id, object_name from dm_document where folder('/Temp')")
+    obj.set_int("BATCH_HINT", 50)
+    obj.set_bool("FOR_UPDATE", False)
+    obj.set_bool("BOF_DQL", True)
+    obj.set_id("OBJECT_ID", "0900000180000001")
+    return obj
+
+
+def run(src):
+    sys.path.insert(0, src)
+    from dctmpy.obj.typedobject import TypedObject
+
+    cases = [("%s x %d" % (x, VALUES), repeating(TypedObject, x), 10)
+             for x in ('STRING', 'INT', 'ID', 'BOOL', 'DOUBLE')]
+    cases.append(("request", request(TypedObject), 10000))
+    for (name, obj, number) in cases:
+        best = min(timeit.repeat(obj.serialize, repeat=REPEAT, number=number)) / number
+        print "%-15s %10.1f us" % (name, best * 1000000)
+
+
+def main(args):
+    if len(args) > 1 and args[0] == '--run':
+        run(args[1])
+        return
+    if not args:
+        args = [os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')]
+    for src in args:
+        print os.path.abspath(src)
+        sys.stdout.flush()
+        subprocess.check_call([sys.executable, os.path.abspath(__file__), '--run', os.path.abspath(src)])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
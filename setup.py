@@ -42,5 +42,6 @@ setup(
             ['nagios_check_docbase = dctmpy.nagios.check_docbase:main [nagios]',
              'nagios_check_docbroker = dctmpy.nagios.check_docbroker:main [nagios]']
     },
-    install_requires=install_requires
+    install_requires=install_requires,
+    test_suite='tests'
 )
@@ -129,6 +129,7 @@ BASE64_PATTERN = re.compile('^[0-9a-zA-Z+/?]+?$')
 INTEGER_PATTERN = re.compile('^-?\d+$')
 ENCODING_PATTERN = re.compile('^(A|H)$')
 BOOLEAN_PATTERN = re.compile('^(T|F|1|0)$')
+ID_PATTERN = re.compile('^[0-9a-f]{16}$')
 
 SINGLE = "S"
 REPEATING = "R"
@@ -214,6 +215,14 @@ CLIENT_VERSION_ARRAY = [
 DEFAULT_BATCH_SIZE = 20
 
 ISO8601_REGEXP = "^([0-9]){4}(-([0-9]){2}){2}T([0-9]{2}:){2}([0-9]){2}Z"
+ISO8601_PATTERN = re.compile(ISO8601_REGEXP)
+DCTM_TIME_PATTERN = re.compile("^[A-Z][a-z]{2} [0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2} [0-9]{4}$")
+UTC_SPLIT_PATTERN = re.compile("[-:TZ]")
+DCTM_SPLIT_PATTERN = re.compile("[: ]")
+
+DEFAULT_TIME_CACHE_SIZE = 4096
+DEFAULT_INTERN_LENGTH = 64
+DEFAULT_INTERN_SIZE = 4096
 
 CHUNKS = {
     RPC_GET_BLOCK1: 256,
@@ -225,10 +234,6 @@ CHUNKS = {
     17023: 0
 }
 
-INT_2_BASE64 = {}
-BASE64_2_INT = {}
-
-
 def get_platform_id():
     (system, release, version) = platform.system_alias(platform.system(), platform.release(), platform.version())
     if re.match("windows", system, re.I) or re.match("windows", release, re.I):
@@ -299,15 +304,11 @@ def parse_address(value):
 
 
 def parse_time(value):
-    if is_empty(value) or "nulldate" == value:
-        return None
-    if re.match(ISO8601_REGEXP, value):
-        return parse_utc_time(value)
-    return parse_dctm_time(value)
+    return TIME_PARSER.parse(value)
 
 
 def parse_utc_time(value):
-    chunks = re.split("[-:TZ]", value)
+    chunks = UTC_SPLIT_PATTERN.split(value)
     if len(chunks) != 7:
         raise ParserException("Invalid date: %s" % value)
     return calendar.timegm(
@@ -315,24 +316,110 @@ def parse_utc_time(value):
          int(chunks[3]), int(chunks[4]), int(chunks[5])])
 
 
-def parse_dctm_time(value):
-    chunks = re.split("[: ]", value)
+def parse_dctm_time(value, utc=False):
+    chunks = DCTM_SPLIT_PATTERN.split(value)
     if len(chunks) != 6:
         raise ParserException("Invalid date: %s" % value)
     if not chunks[0] in MONTHS:
         raise ParserException("Invalid month: %s" % chunks[0])
+    if utc:
+        return calendar.timegm(
+            [int(chunks[5]), MONTHS[chunks[0]], int(chunks[1]),
+             int(chunks[2]), int(chunks[3]), int(chunks[4])])
     return time.mktime(
         [int(chunks[5]), MONTHS[chunks[0]], int(chunks[1]),
          int(chunks[2]), int(chunks[3]), int(chunks[4]),
          0, 0, -1])
 
 
-def get_type_from_cache(attrName):
-    return TypeCache().get(attrName)
+class TimeParser(object):
+    """
+    Decodes TIME values of both wire formats: "2013-05-01T10:11:12Z"
+    (UTC) and "May 01 10:11:12 2013" (server local time, converted by
+    time.mktime). Well-formed values are sliced at fixed offsets, other
+    ones go through parse_utc_time()/parse_dctm_time().
+
+    Results are memoized: a value survives as long as it was used within
+    the last two generations of size / 2 distinct values, which keeps
+    recently used dates like LRU does. With raw=True local times are
+    taken as UTC, i.e. raw epoch ints without timezone conversion.
+    """
 
+    def __init__(self, size=DEFAULT_TIME_CACHE_SIZE, raw=False):
+        self.size = max(size // 2, 1)
+        self.raw = raw
+        self.recent = {}
+        self.older = {}
 
-def add_type_to_cache(typeObj):
-    TypeCache().add(typeObj)
+    def parse(self, value):
+        if not value or value == "nulldate":
+            return None
+        result = self.recent.get(value, None)
+        if result is not None:
+            return result
+        result = self.older.get(value, None)
+        if result is None:
+            result = self._decode(value)
+        if len(self.recent) >= self.size:
+            self.older = self.recent
+            self.recent = {}
+        self.recent[value] = result
+        return result
+
+    def _decode(self, value):
+        if len(value) == 20:
+            if ISO8601_PATTERN.match(value):
+                return calendar.timegm(
+                    (int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                     int(value[11:13]), int(value[14:16]), int(value[17:19])))
+            if value[0:3] in MONTHS and DCTM_TIME_PATTERN.match(value):
+                fields = (int(value[16:20]), MONTHS[value[0:3]], int(value[4:6]),
+                          int(value[7:9]), int(value[10:12]), int(value[13:15]))
+                if self.raw:
+                    return calendar.timegm(fields)
+                return time.mktime(fields + (0, 0, -1))
+        if ISO8601_PATTERN.match(value):
+            return parse_utc_time(value)
+        return parse_dctm_time(value, self.raw)
+
+
+class StringTable(object):
+    """
+    Bounded intern table: equal strings decoded from different records
+    share a single object. Strings longer than max_length are returned
+    as is. Table keeps values used within the last two generations of
+    size / 2 distinct values, the same way TimeParser does.
+    """
+
+    def __init__(self, max_length=DEFAULT_INTERN_LENGTH, size=DEFAULT_INTERN_SIZE):
+        self.max_length = max_length
+        self.size = max(size // 2, 1)
+        self.recent = {}
+        self.older = {}
+
+    def intern(self, value):
+        if len(value) > self.max_length:
+            return value
+        result = self.recent.get(value, None)
+        if result is not None:
+            return result
+        result = self.older.get(value, value)
+        if len(self.recent) >= self.size:
+            self.older = self.recent
+            self.recent = {}
+        self.recent[result] = result
+        return result
+
+
+TIME_PARSER = TimeParser()
+
+
+def get_type_from_cache(docbaseid, attrName):
+    return TypeCache().get(docbaseid, attrName)
+
+
+def add_type_to_cache(docbaseid, typeObj):
+    TypeCache().add(docbaseid, typeObj)
 
 
 def _int_to_pseudo_base64(value):
@@ -345,15 +432,16 @@ def _int_to_pseudo_base64(value):
 
 
 def int_to_pseudo_base64(value):
-    if value not in INT_2_BASE64:
-        INT_2_BASE64[value] = _int_to_pseudo_base64(value)
-    return INT_2_BASE64[value]
+    if 0 <= value < BASE64_TABLE_SIZE:
+        return INT_2_BASE64[value]
+    return _int_to_pseudo_base64(value)
 
 
 def pseudo_base64_to_int(value):
-    if value not in BASE64_2_INT:
-        BASE64_2_INT[value] = _pseudo_base64_to_int(value)
-    return BASE64_2_INT[value]
+    result = BASE64_2_INT.get(value, None)
+    if result is None:
+        return _pseudo_base64_to_int(value)
+    return result
 
 
 def _pseudo_base64_to_int(value):
@@ -365,6 +453,13 @@ def _pseudo_base64_to_int(value):
     return result
 
 
+# all one and two character values are precomputed, longer ones are
+# rare and get computed on each call
+BASE64_TABLE_SIZE = 0x1000
+INT_2_BASE64 = tuple(_int_to_pseudo_base64(i) for i in xrange(0, BASE64_TABLE_SIZE))
+BASE64_2_INT = dict((v, k) for (k, v) in enumerate(INT_2_BASE64))
+
+
 def chunks(l, n):
     for i in xrange(0, len(l), n):
         yield l[i:i + n]
@@ -0,0 +1,209 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import logging
+
+from dctmpy import *
+from dctmpy.docbaseclient import DocbaseClient, MAX_REQUEST_LEN, DEFAULT_CHARSET
+from dctmpy.net.dispatcher import Return
+from dctmpy.net.request import Request, DownloadRequest
+from dctmpy.obj.collection import Collection
+from dctmpy.rpc import pep_name, as_long, as_save_result, as_next_id_list, as_time, as_boolean, as_id, \
+    as_string, as_collection, as_object
+from dctmpy.rpc.rpccommands import Rpc
+
+APPLY_METHODS = {
+    as_long: (RPC_APPLY_FOR_LONG, None),
+    as_save_result: (RPC_APPLY_FOR_LONG, lambda result: result == 1),
+    as_next_id_list: (RPC_APPLY_FOR_OBJECT, lambda result: result['next_id']),
+    as_time: (RPC_APPLY_FOR_TIME, None),
+    as_boolean: (RPC_APPLY_FOR_BOOL, None),
+    as_id: (RPC_APPLY_FOR_ID, None),
+    as_string: (RPC_APPLY_FOR_STRING, None),
+    as_collection: (RPC_APPLY, None),
+    as_object: (RPC_APPLY_FOR_OBJECT, None),
+}
+
+
+class AsyncDocbaseClient(DocbaseClient):
+    """
+    DocbaseClient driven by dctmpy.net.dispatcher.Dispatcher: async_*
+    methods return tasks to be run by Dispatcher.run() or yielded from
+    other tasks, so a single thread may serve many sessions:
+
+        def count(session):
+            yield session.async_open()
+            collection = yield session.async_query("select count(*) from dm_document")
+            records = yield session.async_records(collection)
+            raise Return(records[0]['count(*)'])
+
+        Dispatcher().run(*[count(AsyncDocbaseClient(**x)) for x in docbases])
+
+    Constructor does not connect, async_open() does. Once opened session
+    may be used as an ordinary DocbaseClient too. Server messages and
+    continuation pieces of large responses are still read synchronously.
+    """
+
+    def _open(self):
+        pass
+
+    def async_open(self):
+        if not self.docbaseid >= 0:
+            response = yield self._async_request(RPC_NEW_SESSION_BY_ADDR, self._new_session_data(-1))
+            self._read_docbase_id(response)
+            self.disconnect()
+
+        response = yield self._async_request(RPC_NEW_SESSION_BY_ADDR, self._new_session_data(self.docbaseid))
+        self._read_session(response)
+
+        if not self._load_entry_points():
+            self._bootstrap_entry_points()
+            entrypoints = yield self.async_call('ENTRY_POINTS')
+            self._set_entry_points(entrypoints.methods())
+
+        yield self._async_set_locale()
+
+        if self._can_authenticate():
+            yield self.async_authenticate()
+
+    def _async_request(self, rpc_id, data):
+        request = self.send(Request, type=rpc_id, data=data)
+        response = yield self, request
+        raise Return(response)
+
+    def _async_set_locale(self, charset=CHARSETS[DEFAULT_CHARSET]):
+        if charset not in CHARSETS_REVERSE:
+            raise RuntimeError("Unknown charset id %s" % charset)
+        try:
+            yield self.async_call('SET_LOCALE', charset)
+        except Exception, e:
+            if not e.message.startswith('[DM_SESSION_E_NO_TRANSLATOR]'):
+                raise e
+            if charset == CHARSETS[DEFAULT_CHARSET]:
+                raise e
+            logging.warning("Unable to set charset %s, falling back to %s"
+                            % (CHARSETS_REVERSE[charset], DEFAULT_CHARSET))
+            yield self.async_call('SET_LOCALE', CHARSETS[DEFAULT_CHARSET])
+
+    def async_authenticate(self, username=None, password=None, identity=None):
+        if username:
+            self.username = username
+        if password:
+            self.password = password
+        if identity:
+            self.identity = identity
+
+        if not self._can_authenticate():
+            raise RuntimeError("Can't perform authentication")
+
+        result = yield self.async_call('AUTHENTICATE_USER', self.username, self.obfuscate(self.password),
+                                       self.identity)
+        if result['RETURN_VALUE'] != 1:
+            raise RuntimeError("Unable to authenticate")
+
+        self.docbaseconfig = yield self.async_call('GET_DOCBASE_CONFIG')
+        self.serverconfig = yield self.async_call('GET_SERVER_CONFIG')
+
+    def async_rpc(self, rpc_id, data=None):
+        if not data:
+            data = []
+        request = self.send(Request, type=rpc_id, data=data)
+        yield self, request
+        raise Return(self.rpc(rpc_id, data, request))
+
+    def async_apply(self, rpc_id, object_id, method, request=None, cls=Collection):
+        (rpc_id, object_id, req) = self._apply_args(rpc_id, object_id, request)
+        if req and len(req) > MAX_REQUEST_LEN:
+            raise Return(self.apply_chunks(rpc_id, object_id, method, req, cls))
+
+        response = yield self.async_rpc(rpc_id, [self._get_method(method), object_id, req])
+        raise Return(self._apply_result(rpc_id, request, response, cls))
+
+    def async_call(self, name, *args):
+        """
+        Task counterpart of entry point methods: async_call('TIME') does
+        what time() does, arguments are the same
+        """
+        if name not in self.known_commands:
+            (object_id, request, cls) = (list(args) + [NULL_ID, None, Collection][len(args):])[:3]
+            result = yield self.async_apply(RPC_APPLY, object_id, name, request, cls)
+            raise Return(result)
+
+        command = self.known_commands[name]
+        (rpc_id, convert) = APPLY_METHODS[command.method]
+        object_id = NULL_ID
+        if command.need_id and args:
+            object_id = args[0] or NULL_ID
+            args = args[1:]
+        request = getattr(Rpc, pep_name(name), None)
+        if request:
+            if request.func_code.co_argcount == 1:
+                request = request(self)
+            else:
+                request = request(self, *args)
+        result = yield self.async_apply(rpc_id, object_id, name, request, command.return_type)
+        if convert:
+            result = convert(result)
+        raise Return(result)
+
+    def async_query(self, query, for_update=False, batch_hint=DEFAULT_BATCH_SIZE, bof_dql=False):
+        try:
+            collection = yield self.async_call('EXEC', query, for_update, batch_hint, bof_dql)
+        except Exception, e:
+            raise RuntimeError("Error occurred while executing query: %s" % query, e)
+        raise Return(collection)
+
+    def async_records(self, collection):
+        """
+        Returns records of the next batch of collection, collection is
+        closed and empty list is returned once it is exhausted
+        """
+        if collection is None or collection.collection is None:
+            raise Return([])
+        if collection._need_batch():
+            data = [collection.collection, collection.batch_size]
+            request = self.send(Request, type=RPC_MULTI_NEXT, data=data)
+            yield self, request
+            collection._load_batch(self.rpc(RPC_MULTI_NEXT, data, request))
+        records = []
+        while collection._has_records():
+            records.append(collection.next_record())
+        if not records:
+            yield self.async_close_collection(collection)
+        raise Return(records)
+
+    def async_close_collection(self, collection):
+        if collection.collection is None:
+            return
+        data = [collection.collection]
+        while collection.pending:
+            request = collection.pending.popleft()
+            yield self, request
+            try:
+                self.rpc(RPC_MULTI_NEXT, [collection.collection, collection.batch_size], request)
+            except:
+                pass
+        collection.collection = None
+        yield self.async_rpc(RPC_CLOSE_COLLECTION, data)
+
+    def async_download(self, handle, rpc=RPC_GET_BLOCK5, write=None):
+        """
+        Reads content of given puller handle, blocks are passed to write
+        as they arrive, or returned as a list if write is not specified
+        """
+        chunks = []
+        i = 0
+        while True:
+            request = self.send(DownloadRequest, False, type=rpc, data=[handle, i])
+            response = yield self, request
+            (data, last) = self._read_block(response)
+            for chunk in data:
+                if write:
+                    write(chunk)
+                else:
+                    chunks.append(chunk)
+            if last:
+                break
+            i += 1
+        raise Return(chunks)
@@ -3,13 +3,20 @@
 # See main module for license.
 #
 import logging
+from collections import deque
 
 from dctmpy import *
+from dctmpy.exceptions import ParserException, ProtocolException
+from dctmpy.net import join_segments
 from dctmpy.net.netwise import Netwise
-from dctmpy.net.request import Request, DownloadRequest, UploadRequest
-from dctmpy.obj.collection import Collection, PersistentCollection
+from dctmpy.net.request import Request, DownloadRequest, UploadRequest, StreamingRequest
+from dctmpy.obj import R_OBJECT_ID
+from dctmpy.obj.collection import Collection, PersistentCollection, BatchSizer
+from dctmpy.obj.entrypoints import ENTRY_POINT_CACHE
+from dctmpy.obj.objectcache import ObjectCache
 from dctmpy.obj.persistent import PersistentProxy
 from dctmpy.obj.type import TypeObject
+from dctmpy.obj.typecache import TypeCache
 from dctmpy.obj.typedobject import TypedObject
 from dctmpy.rpc import pep_name, register_known_commands, as_collection
 from dctmpy.rpc.messages import get_message, ERROR, INFORMATION
@@ -23,12 +30,20 @@ DEFAULT_CHARSET = 'UTF-8'
 
 MAX_REQUEST_LEN = CHUNKS[RPC_GET_BLOCK5]
 
+WARM_UP_WINDOW = 16
+
+FETCH_WINDOW = 32
+DQL_IN_CHUNK = 250
+
 
 class DocbaseClient(Netwise):
     attributes = ['docbaseid', 'username', 'password', 'messages', 'entrypoints',
                   'ser_version', 'iso8601time', 'session', 'ser_version_hint',
                   'docbaseconfig', 'serverconfg', 'known_commands', 'reading_messages',
-                  'collections', 'identity']
+                  'collections', 'identity', 'validate', 'prefetch', 'batch_sizer',
+                  'server_version', 'entrypoint_cache', 'type_cache_path', 'warm_up',
+                  'lazy', 'time_parser', 'floats', 'compact_ids', 'intern_strings',
+                  'streaming', 'object_cache']
 
     def __init__(self, **kwargs):
         for attribute in DocbaseClient.attributes:
@@ -46,29 +61,62 @@ class DocbaseClient(Netwise):
             self.ser_version = 0
         if self.iso8601time is None:
             self.iso8601time = False
-        if not self.docbaseid >= 0:
-            self._resolve_docbase_id()
+        if self.validate is None:
+            self.validate = True
+        if self.prefetch is None:
+            self.prefetch = 0
+        if self.lazy is None:
+            self.lazy = False
+        if self.time_parser is None:
+            self.time_parser = TIME_PARSER
+        if self.floats is None:
+            self.floats = False
+        if self.compact_ids is None:
+            self.compact_ids = False
+        if self.streaming is None:
+            self.streaming = False
+        if self.batch_sizer is True:
+            self.batch_sizer = BatchSizer()
+        if self.object_cache is True:
+            self.object_cache = ObjectCache()
+        if self.entrypoint_cache is None:
+            self.entrypoint_cache = ENTRY_POINT_CACHE
+        if self.type_cache_path:
+            TypeCache().persist(self.type_cache_path)
         if self.messages is None:
             self.messages = []
         if self.ser_version_hint is None:
             self.ser_version_hint = CLIENT_VERSION_ARRAY[3]
 
+        self._open()
+
+    def _open(self):
+        if not self.docbaseid >= 0:
+            self._resolve_docbase_id()
+
         self._connect()
         self._fetch_entry_points()
         self._set_locale()
 
         if self._can_authenticate():
             self.authenticate()
+            if self.warm_up:
+                self.warm_up_types([None, self.warm_up][self.warm_up is not True])
 
-    def _resolve_docbase_id(self):
-        data = [-1, EMPTY_STRING, CLIENT_VERSION_STRING,
+    def _new_session_data(self, docbaseid):
+        return [docbaseid, EMPTY_STRING, CLIENT_VERSION_STRING,
                 EMPTY_STRING, CLIENT_VERSION_ARRAY, NULL_ID, ]
-        response = self.request(Request, type=RPC_NEW_SESSION_BY_ADDR, data=data)
+
+    def _resolve_docbase_id(self):
+        response = self.request(Request, type=RPC_NEW_SESSION_BY_ADDR, data=self._new_session_data(-1))
+        self._read_docbase_id(response)
+        self.disconnect()
+
+    def _read_docbase_id(self, response):
         reason = response.next()
         m = re.search('Wrong docbase id: \(-1\) expecting: \((\d+)\)', reason)
         if m:
             self.docbaseid = int(m.group(1))
-        self.disconnect()
 
     def _set_locale(self, charset=CHARSETS[DEFAULT_CHARSET]):
         if charset not in CHARSETS_REVERSE:
@@ -105,12 +153,13 @@ class DocbaseClient(Netwise):
             self.session = None
 
     def _connect(self):
-        data = [self.docbaseid, EMPTY_STRING, CLIENT_VERSION_STRING,
-                EMPTY_STRING, CLIENT_VERSION_ARRAY, NULL_ID, ]
-        response = self.request(Request, type=RPC_NEW_SESSION_BY_ADDR, data=data)
+        response = self.request(Request, type=RPC_NEW_SESSION_BY_ADDR, data=self._new_session_data(self.docbaseid))
+        self._read_session(response)
 
+    def _read_session(self, response):
         reason = response.next()
         server_version = response.next()
+        self.server_version = ".".join(str(x) for x in server_version)
         if server_version[7] == DM_CLIENT_SERIALIZATION_VERSION_HINT:
             self.ser_version = DM_CLIENT_SERIALIZATION_VERSION_HINT
         else:
@@ -135,27 +184,30 @@ class DocbaseClient(Netwise):
         i = 0
         while True:
             response = self.request(DownloadRequest, False, type=rpc, data=[handle, i])
-            length = response.next()
-            last = response.next() == 1
-            data = response.next()
-            if length == 0 and not last:
-                raise RuntimeError("Puller is closed")
-            if isinstance(data, list):
-                l = 0
-                for chunk in data:
-                    l += len(chunk)
-                if length != l:
-                    raise RuntimeError("Invalid content size")
-                for chunk in data:
-                    yield chunk
-            else:
-                if length != len(data):
-                    raise RuntimeError("Invalid content size")
-                yield data
+            (chunks, last) = self._read_block(response)
+            for chunk in chunks:
+                yield chunk
             if last:
                 break
             i += 1
 
+    def _read_block(self, response):
+        length = response.next()
+        last = response.next() == 1
+        data = response.next()
+        if length == 0 and not last:
+            raise RuntimeError("Puller is closed")
+        if isinstance(data, list):
+            l = 0
+            for chunk in data:
+                l += len(chunk)
+            if length != l:
+                raise RuntimeError("Invalid content size")
+            return data, last
+        if length != len(data):
+            raise RuntimeError("Invalid content size")
+        return [data], last
+
     def upload(self, handle, data):
         offset = 0
         response = self.request(UploadRequest, type=RPC_DO_PUSH, data=[handle])
@@ -169,14 +221,56 @@ class DocbaseClient(Netwise):
             if stop:
                 break
 
-    def rpc(self, rpc_id, data=None):
+    def rpc(self, rpc_id, data=None, request=None):
+        result = self._receive_result(rpc_id, data, request)
+        if self._has_next_piece(rpc_id, result.oob_data):
+            if not self._can_read_pieces(request):
+                raise ProtocolException("Continuation of RPC 0x%X response can't be read, %d requests were sent "
+                                        "after it" % (rpc_id, self.sequence - request.sequence))
+            result.pieces.extend(self.rpc(RPC_GET_NEXT_PIECE).pieces)
+        return result
+
+    def _receive_result(self, rpc_id, data=None, request=None):
+        """
+        Reads RPC result, continuation pieces are not asked for
+        """
         if not data:
             data = []
 
+        if request is None:
+            response = self.request(Request, type=rpc_id, data=data)
+        else:
+            response = self.receive(request)
+        message = response.next()
+        result = self._read_result(rpc_id, data, response)
+        result.pieces = [message]
+        return result
+
+    def _receive_sent(self, rpc_id, data, request):
+        """
+        Reads result of request sent ahead, the request is sent again if
+        continuation pieces of its response were dropped by requests sent
+        after it, so it must not change anything on server
+        """
+        result = self._receive_result(rpc_id, data, request)
+        if not self._has_next_piece(rpc_id, result.oob_data):
+            return result
+        if not self._can_read_pieces(request):
+            return self.rpc(rpc_id, data)
+        result.pieces.extend(self.rpc(RPC_GET_NEXT_PIECE).pieces)
+        return result
+
+    def _can_read_pieces(self, request):
+        # server keeps the rest of response only until the next request
+        return request is None or request.sequence == self.sequence
+
+    def _read_result(self, rpc_id, data, response):
+        """
+        Reads RPC result following the data argument of response, returns
+        Response without data
+        """
         (valid, oob_data, collection, persistent, may_be_more, record_count) = (None, None, None, None, None, None)
 
-        response = self.request(Request, type=rpc_id, data=data)
-        message = response.next()
         if rpc_id == RPC_APPLY_FOR_OBJECT:
             valid = int(response.next()) > 0
             persistent = int(response.next()) > 0
@@ -211,13 +305,13 @@ class DocbaseClient(Netwise):
         elif valid is not None and not valid:
             raise RuntimeError("Unknown error")
 
-        if oob_data == 0x10 or (oob_data == 0x01 and rpc_id == RPC_GET_NEXT_PIECE):
-            message += self.rpc(RPC_GET_NEXT_PIECE).data
-
-        return Response(data=message, oob_data=oob_data, persistent=persistent,
+        return Response(pieces=[], oob_data=oob_data, persistent=persistent,
                         collection=collection, may_be_more=may_be_more,
                         record_count=record_count)
 
+    def _has_next_piece(self, rpc_id, oob_data):
+        return oob_data == 0x10 or (oob_data == 0x01 and rpc_id == RPC_GET_NEXT_PIECE)
+
     def apply_chunks(self, rpc_id, object_id, method, request, cls=Collection):
         if not object_id or object_id == NULL_ID:
             object_id = self.session
@@ -227,7 +321,15 @@ class DocbaseClient(Netwise):
         self.set_push_object_status(object_id, False)
         return self.apply(rpc_id, object_id, method, "_USE_SESSION_CHUNKED_OBJ_STRING_", cls)
 
-    def apply(self, rpc_id, object_id, method, request=None, cls=Collection):
+    def apply(self, rpc_id, object_id, method, request=None, cls=Collection, attrs=None):
+        (rpc_id, object_id, req) = self._apply_args(rpc_id, object_id, request)
+        if req and len(req) > MAX_REQUEST_LEN:
+            return self.apply_chunks(rpc_id, object_id, method, req, cls)
+
+        response = self.rpc(rpc_id, [self._get_method(method), object_id, req])
+        return self._apply_result(rpc_id, request, response, cls, attrs)
+
+    def _apply_args(self, rpc_id, object_id, request):
         if rpc_id is None:
             rpc_id = RPC_APPLY
 
@@ -239,10 +341,9 @@ class DocbaseClient(Netwise):
             req = TypedObject(session=self)
         if isinstance(req, TypedObject):
             req = req.serialize()
-        if req and len(req) > MAX_REQUEST_LEN:
-            return self.apply_chunks(rpc_id, object_id, method, req, cls)
+        return rpc_id, object_id, req
 
-        response = self.rpc(rpc_id, [self._get_method(method), object_id, req])
+    def _apply_result(self, rpc_id, request, response, cls, attrs=None):
         data = response.data
 
         if rpc_id == RPC_APPLY_FOR_STRING:
@@ -273,7 +374,7 @@ class DocbaseClient(Netwise):
         if is_empty(data):
             return None
 
-        result = cls(session=self, buffer=data)
+        result = cls(session=self, buffer=data, projection=attrs)
         if response.collection is not None and isinstance(result, Collection):
             result.collection = response.collection
             result.persistent = response.persistent
@@ -364,13 +465,63 @@ class DocbaseClient(Netwise):
         self.docbaseconfig = self.get_docbase_config()
         self.serverconfig = self.get_server_config()
 
-    def next_batch(self, collection, batch_hint=DEFAULT_BATCH_SIZE):
-        return self.rpc(RPC_MULTI_NEXT, [collection, batch_hint])
+    def next_batch(self, collection, batch_hint=DEFAULT_BATCH_SIZE, request=None):
+        return self.rpc(RPC_MULTI_NEXT, [collection, batch_hint], request)
+
+    def prefetch_batch(self, collection, batch_hint=DEFAULT_BATCH_SIZE):
+        """
+        Sends RPC_MULTI_NEXT without waiting for response, the returned
+        request is to be passed to next_batch()
+        """
+        return self.send(Request, type=RPC_MULTI_NEXT, data=[collection, batch_hint])
+
+    def stream_batch(self, collection, batch_hint=DEFAULT_BATCH_SIZE):
+        """
+        Sends RPC_MULTI_NEXT and returns once response starts to arrive:
+        batch data is then pulled from socket by read() of the returned
+        stream, end_stream() reads RPC result when data is over
+        """
+        return self.receive(self.send(StreamingRequest, type=RPC_MULTI_NEXT, data=[collection, batch_hint]))
+
+    def end_stream(self, stream):
+        """
+        Returns result of streamed RPC as Response without data, and the
+        stream of continuation piece, None if there is no more pieces
+        """
+        result = self._read_result(stream.rpc, None, stream)
+        if self._has_next_piece(stream.rpc, result.oob_data):
+            return result, self.receive(self.send(StreamingRequest, type=RPC_GET_NEXT_PIECE))
+        return result, None
 
     def close_collection(self, collection):
         self.rpc(RPC_CLOSE_COLLECTION, [collection])
 
     def _fetch_entry_points(self):
+        if self._load_entry_points():
+            return
+        self._bootstrap_entry_points()
+        self._set_entry_points(self.entry_points().methods())
+
+    def _load_entry_points(self):
+        if not self.entrypoint_cache:
+            return False
+        cached = self.entrypoint_cache.get(self.host, self.docbaseid, self.server_version)
+        if cached is None:
+            return False
+        (entrypoints, known_commands) = cached
+        self.entrypoints = dict(entrypoints)
+        if known_commands is None:
+            self.known_commands = {}
+            register_known_commands(self)
+            self.entrypoint_cache.put(self.host, self.docbaseid, self.server_version,
+                                      entrypoints, self.known_commands)
+        else:
+            self.known_commands = known_commands
+        for name in self.entrypoints.keys():
+            self._add_entry_point(name)
+        return True
+
+    def _bootstrap_entry_points(self):
         if self.entrypoints is None:
             self.entrypoints = {
                 'ENTRY_POINTS': 0,
@@ -382,10 +533,14 @@ class DocbaseClient(Netwise):
             for name in self.entrypoints.keys():
                 self._add_entry_point(name)
 
-        self.entrypoints = self.entry_points().methods()
+    def _set_entry_points(self, entrypoints):
+        self.entrypoints = entrypoints
         register_known_commands(self)
         for name in self.entrypoints.keys():
             self._add_entry_point(name)
+        if self.entrypoint_cache:
+            self.entrypoint_cache.put(self.host, self.docbaseid, self.server_version,
+                                      dict(entrypoints), self.known_commands)
 
     def get_by_qualification(self, qualification):
         collection = self.query("select r_object_id from %s" % qualification)
@@ -398,22 +553,181 @@ class DocbaseClient(Netwise):
             if collection:
                 collection.close()
 
-    def get_object(self, objectid):
-        obj = self.fetch(objectid)
+    def get_object(self, objectid, attrs=None):
+        """
+        Fetches object, if attrs is specified only those attributes
+        (and r_object_id) are decoded. Complete objects are taken from
+        and stored into object_cache if session has one.
+        """
+        if attrs is None and self.object_cache is not None:
+            obj = self.object_cache.get(self, objectid)
+            if obj is not None:
+                return obj
+        if attrs is None:
+            obj = self.fetch(objectid)
+            if obj is not None and self.object_cache is not None:
+                self.object_cache.put(self, obj)
+        else:
+            obj = self.apply(RPC_APPLY_FOR_OBJECT, objectid, "FETCH", None, PersistentProxy,
+                             set(attrs) | set([R_OBJECT_ID]))
         if obj is None:
             raise RuntimeError("Unable to fetch object with id %s" % objectid)
         return obj
 
+    def get_objects(self, ids, attrs=None, window=FETCH_WINDOW):
+        """
+        Fetches objects with given ids, results are returned in the same
+        order, None stands for objects which could not be fetched. Up to
+        window FETCH requests are sent without waiting for responses.
+        """
+        ids = list(ids)
+        if attrs is not None:
+            attrs = set(attrs) | set([R_OBJECT_ID])
+        result = []
+        pending = deque()
+        try:
+            for objectid in ids:
+                pending.append(self._send_fetch(objectid))
+                if len(pending) >= window:
+                    result.append(self._receive_object(pending.popleft(), attrs))
+            while pending:
+                result.append(self._receive_object(pending.popleft(), attrs))
+        except (ProtocolException, ParserException), e:
+            self._drain(pending)
+            raise e
+        return result
+
+    def _send_fetch(self, objectid):
+        (rpc_id, object_id, request) = self._apply_args(RPC_APPLY_FOR_OBJECT, objectid, None)
+        data = [self._get_method("FETCH"), object_id, request]
+        return rpc_id, data, self.send(Request, type=rpc_id, data=data)
+
+    def _receive_object(self, sent, attrs):
+        (rpc_id, data, pending) = sent
+        try:
+            response = self._receive_sent(rpc_id, data, pending)
+        except (ProtocolException, ParserException):
+            raise
+        except RuntimeError, e:
+            # error reported by server for this object
+            logging.debug("Unable to fetch object with id %s: %s" % (data[2], e))
+            return None
+        return self._apply_result(rpc_id, None, response, PersistentProxy, attrs)
+
+    def _drain(self, pending):
+        """
+        Reads responses of requests sent ahead, connection is closed if
+        responses can't be told apart anymore
+        """
+        try:
+            for sent in pending:
+                self.receive(sent[-1])
+        except:
+            super(DocbaseClient, self).disconnect()
+
+    def query_objects(self, ids, attrs, type_name):
+        """
+        Queries attrs of objects with given ids, DQL_IN_CHUNK ids per
+        "r_object_id IN (...)" query. Query records are returned in the
+        order of ids, None stands for objects which were not found.
+        type_name is queried with (ALL), so non-current versions are
+        found as well, type_name must be dm_sysobject or its subtype.
+        """
+        ids = list(ids)
+        names = [R_OBJECT_ID] + [x for x in attrs if x != R_OBJECT_ID]
+        for objectid in ids:
+            if not ID_PATTERN.match(str(objectid)):
+                raise RuntimeError("Invalid object id: %s" % objectid)
+        records = {}
+        for chunk in chunks(ids, DQL_IN_CHUNK):
+            query = "SELECT %s FROM %s (ALL) WHERE r_object_id IN ('%s')" % (
+                ", ".join(names), type_name, "', '".join(str(x) for x in chunk))
+            for record in self.query(query, batch_hint=len(chunk)):
+                records[str(record[R_OBJECT_ID])] = record
+        return [records.get(str(x), None) for x in ids]
+
     def get_type(self, name, vstamp=0):
-        type_obj = get_type_from_cache(name)
-        if type_obj:
+        """
+        Returns type info from cache, cached type is fetched again if
+        vstamp tells it is outdated. Types persisted by TypeCache are
+        tried before the server.
+        """
+        type_obj = get_type_from_cache(self.docbaseid, name)
+        if type_obj is None:
+            data = TypeCache().get_data(self.docbaseid, name, self.ser_version)
+            if data is not None:
+                type_obj = TypeObject(session=self, buffer=data).type
+        if type_obj is not None and not self._is_outdated(type_obj, vstamp):
             return type_obj
-        data = None
+
+        cache_vstamp = 0
+        if type_obj is not None:
+            cache_vstamp = type_obj.vstamp
+        data = self._fetch_type(name, cache_vstamp)
+        if is_empty(data):
+            if type_obj is None:
+                raise RuntimeError("Unable to fetch type %s" % name)
+            # server confirmed cached definition is current
+            type_obj.vstamp = vstamp
+            return type_obj
+        return self._add_type(name, data)
+
+    def _add_type(self, name, data):
+        TypeCache().add_data(self.docbaseid, name, self.ser_version, data)
+        return TypeObject(session=self, buffer=data).type
+
+    def warm_up_types(self, names=None, window=WARM_UP_WINDOW):
+        """
+        Loads given types (all types from dm_type if names is None) into
+        TypeCache ahead of time, up to window FETCH_TYPE requests are
+        sent without waiting for responses
+        """
+        if names is None:
+            names = [record['name'] for record in self.query("select name from dm_type")]
+        pending = deque()
+        for name in names:
+            if get_type_from_cache(self.docbaseid, name) is not None:
+                continue
+            if TypeCache().get_data(self.docbaseid, name, self.ser_version) is not None:
+                self.get_type(name)
+                continue
+            pending.append((name, self._send_fetch_type(name)))
+            if len(pending) >= window:
+                self._receive_type(*pending.popleft())
+        while pending:
+            self._receive_type(*pending.popleft())
+
+    def _send_fetch_type(self, name):
         if "FETCH_TYPE" in self.entrypoints:
-            data = self.fetch_type(name, vstamp)['result']
+            rpc_id = RPC_APPLY_FOR_OBJECT
+            request = Rpc.fetch_type(self, name, 0)
+            data = [self._get_method("FETCH_TYPE"), NULL_ID, request.serialize()]
         else:
-            data = self.rpc(RPC_FETCH_TYPE, [name]).data
-        return TypeObject(session=self, buffer=data).type
+            rpc_id = RPC_FETCH_TYPE
+            request = None
+            data = [name]
+        return rpc_id, request, data, self.send(Request, type=rpc_id, data=data)
+
+    def _receive_type(self, name, sent):
+        (rpc_id, request, data, pending) = sent
+        response = self._receive_sent(rpc_id, data, pending)
+        if rpc_id == RPC_APPLY_FOR_OBJECT:
+            result = self._apply_result(rpc_id, request, response, TypedObject)['result']
+        else:
+            result = response.data
+        if is_empty(result):
+            raise RuntimeError("Unable to fetch type %s" % name)
+        self._add_type(name, result)
+
+    def _is_outdated(self, type_obj, vstamp):
+        if not vstamp or type_obj.vstamp is None:
+            return False
+        return type_obj.vstamp < vstamp
+
+    def _fetch_type(self, name, vstamp=0):
+        if "FETCH_TYPE" in self.entrypoints:
+            return self.fetch_type(name, vstamp)['result']
+        return self.rpc(RPC_FETCH_TYPE, [name]).data
 
     def query(self, query, for_update=False, batch_hint=DEFAULT_BATCH_SIZE, bof_dql=False):
         try:
@@ -485,17 +799,42 @@ class DocbaseClient(Netwise):
         setattr(self.__class__, inner.__name__, inner)
 
     def request(self, cls, add_session=True, **kwargs):
+        return self.receive(self.send(cls, add_session, **kwargs))
+
+    def send(self, cls, add_session=True, **kwargs):
         data = kwargs.pop("data", [])
         if add_session and self.session:
             if len(data) == 0 or data[0] != self.session:
                 data.insert(0, self.session)
         kwargs["data"] = data
-        return super(DocbaseClient, self).request(cls, **kwargs)
+        return super(DocbaseClient, self).send(cls, **kwargs)
 
 
 class Response(object):
-    attributes = ['data', 'oob_data', 'persistent', 'collection', 'record_count', 'may_be_more']
+    attributes = ['pieces', 'oob_data', 'persistent', 'collection', 'record_count', 'may_be_more']
 
     def __init__(self, **kwargs):
         for attribute in Response.attributes:
             setattr(self, attribute, kwargs.pop(attribute, None))
+        if self.pieces is None:
+            self.pieces = as_list(kwargs.pop('data', None))
+
+        self.joined = None
+
+    @property
+    def data(self):
+        """
+        Response data as a single string, continuation pieces are joined
+        on first access, collections read pieces one by one instead
+        """
+        if len(self.pieces) == 0:
+            return None
+        if len(self.pieces) == 1:
+            return self.pieces[0]
+        if self.joined is None:
+            self.joined = buffer(join_segments(self.pieces))
+        return self.joined
+
+    @property
+    def length(self):
+        return sum(len(x) for x in self.pieces)
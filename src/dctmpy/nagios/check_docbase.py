@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import argparse
+import itertools
 import re
 import time
 
@@ -22,7 +23,7 @@ from xml.dom import minidom
 from nagiosplugin import Metric, Result, Check, Resource, guarded, ScalarContext
 from nagiosplugin.state import Critical, Warn, Ok, Unknown
 
-from dctmpy.docbaseclient import DocbaseClient
+from dctmpy.docbaseclient import DocbaseClient, FETCH_WINDOW
 from dctmpy.docbrokerclient import DocbrokerClient
 
 
@@ -784,12 +785,16 @@ class CheckDocbase(Resource):
     def check_store(self, store):
         query = "SELECT r_object_id FROM dmr_content WHERE storage_id='%s'" % store['r_object_id']
         content = None
-        for c in self.session.query(query):
-            content = self.session.get_object(c['r_object_id'])
-            if content['full_content_size'] > 0:
+        collection = self.session.query(query)
+        while content is None:
+            ids = [c['r_object_id'] for c in itertools.islice(collection, FETCH_WINDOW)]
+            if not ids:
                 break
-            else:
-                content = None
+            for obj in self.session.get_objects(ids):
+                if obj is not None and obj['full_content_size'] > 0:
+                    content = obj
+                    break
+        collection.close()
         if not content:
             message = "No content in store %s" % store['name']
             return Result(Ok, message)
@@ -15,8 +15,12 @@ INT_ARRAY_START = 0x30
 LONG_LENGTH_START = 0x82
 STRING_ARRAY_START = 0x36
 
-INTEGERS = {}
-LENGTHS = {}
+EMPTY_ARRAY = bytearray([EMPTY_STRING_START, NULL_BYTE])
+NULL_TERMINATOR = bytearray([NULL_BYTE])
+
+# values below SMALL_VALUES are taken from precomputed tables, others
+# are encoded on each call
+SMALL_VALUES = 0x100
 
 
 def _serialize_integer(value):
@@ -30,15 +34,13 @@ def _serialize_integer(value):
     result.append(len(result))
     result.append(INTEGER_START)
     result.reverse()
-    return result
+    return bytes(result)
 
 
 def serialize_integer(value):
     if value is None:
         raise RuntimeError("Undefined integer value")
-    if -0xffff <= value <= 0xffff:
-        if value not in INTEGERS:
-            INTEGERS[value] = _serialize_integer(value)
+    if 0 <= value < SMALL_VALUES:
         return INTEGERS[value]
     return _serialize_integer(value)
 
@@ -54,32 +56,37 @@ def _serialize_length(value):
     if len(result) > 1:
         result.append(len(result) | 0x80)
     result.reverse()
-    return result
+    return bytes(result)
 
 
 def serialize_length(value):
     if value is None:
         raise RuntimeError("Undefined integer value")
-    if value <= 0xffff:
-        if value not in LENGTHS:
-            LENGTHS[value] = _serialize_length(value)
+    if 0 <= value < SMALL_VALUES:
         return LENGTHS[value]
     return _serialize_length(value)
 
 
+INTEGERS = tuple(_serialize_integer(i) for i in xrange(0, SMALL_VALUES))
+LENGTHS = tuple(_serialize_length(i) for i in xrange(0, SMALL_VALUES))
+
+
 def serialize_array(value, asstring=False):
-    result = bytearray()
+    return join_segments(array_segments(value, asstring))
+
+
+def array_segments(value, asstring=False):
     if not value:
-        result.append(EMPTY_STRING_START)
-        result.append(NULL_BYTE)
-        return result
-    result.extend(value)
+        return [EMPTY_ARRAY]
+    length = len(value)
     if asstring:
-        result.append(NULL_BYTE)
-    for b in reversed(serialize_length(len(result))):
-        result.insert(0, b)
-    result.insert(0, STRING_START)
-    return result
+        length += 1
+    prefix = bytearray()
+    prefix.append(STRING_START)
+    prefix.extend(serialize_length(length))
+    if asstring:
+        return [prefix, value, NULL_TERMINATOR]
+    return [prefix, value]
 
 
 def serialize_string(value):
@@ -104,32 +111,55 @@ def serialize_integer_array(intarray):
 
 
 def serialize_value(value):
+    return join_segments(value_segments(value))
+
+
+def value_segments(value):
     if value is None:
-        return serialize_string("")
+        return array_segments("", True)
     elif isinstance(value, str):
-        return serialize_string(value)
+        return array_segments(value, True)
     elif isinstance(value, buffer):
-        return serialize_string(value)
+        return array_segments(value, True)
     elif isinstance(value, bytearray):
-        return serialize_array(value)
+        return array_segments(value)
     elif isinstance(value, int):
-        return serialize_integer(value)
+        return [serialize_integer(value)]
     elif isinstance(value, list):
-        return serialize_integer_array(value)
+        return [serialize_integer_array(value)]
     elif isinstance(value, TypedObject):
-        return serialize_string(value.serialize())
+        return array_segments(value.serialize(), True)
     elif hasattr(value.__class__, "serialize"):
-        return serialize_string(value.serialize())
+        return array_segments(value.serialize(), True)
     else:
         raise TypeError("Invalid argument type")
 
 
 def serialize_data(data=None):
-    result = bytearray()
+    return join_segments(data_segments(data))
+
+
+def data_segments(data=None):
+    """
+    Serializes request arguments into a list of segments: length
+    prefixes are built here, payloads are referenced as is, so they
+    get copied only once, when the segments are written out
+    """
+    result = []
     if data is None:
         return result
     for i in data:
-        result.extend(serialize_value(i))
+        result.extend(value_segments(i))
+    return result
+
+
+def join_segments(segments, result=None, offset=0):
+    if result is None:
+        result = bytearray(offset + sum(len(x) for x in segments))
+    for segment in segments:
+        length = len(segment)
+        result[offset:offset + length] = segment
+        offset += length
     return result
 
 
@@ -181,30 +211,35 @@ def read_integer_array(data, offset=0):
     return result, offset
 
 
-def read_array(data, offset=0, asstring=False):
+def read_array(data, offset=0, asstring=False, view=False):
     sequence = data[offset]
     if sequence == EMPTY_STRING_START and data[1 + offset] == NULL_BYTE:
+        if view:
+            return buffer(data, offset, 0), offset + 2
         return bytearray(), offset + 2
     elif sequence == STRING_START:
         (length, offset) = read_length(data, offset + 1)
+        size = length
         if asstring and data[offset + length - 1] == NULL_BYTE:
-            result = data[offset: offset + length - 1]
+            size = length - 1
+        if view:
+            result = buffer(data, offset, size)
         else:
-            result = data[offset: offset + length]
+            result = data[offset: offset + size]
         return result, offset + length
     elif sequence == STRING_ARRAY_START and data[1 + offset] == 0x80:
         offset += 2
         result = bytearray()
         while data[offset] != NULL_BYTE or data[offset + 1] != NULL_BYTE:
-            (chunk, offset) = read_array(data, offset, asstring)
+            (chunk, offset) = read_array(data, offset, asstring, view)
             result.extend(chunk)
         return result, offset + 2
     raise RuntimeError("Unknown sequence: 0x%X" % sequence)
 
 
-def read_string(data, offset=0):
-    return read_array(data, offset, True)
+def read_string(data, offset=0, view=False):
+    return read_array(data, offset, True, view)
 
 
-def read_binary(data, offset=0):
-    return read_array(data, offset, False)
+def read_binary(data, offset=0, view=False):
+    return read_array(data, offset, False, view)
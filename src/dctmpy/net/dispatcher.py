@@ -0,0 +1,165 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import select
+import sys
+import types
+from collections import deque
+
+
+class Return(BaseException):
+    """
+    Raised by a task to return value to the task which yielded it
+    """
+
+    def __init__(self, value=None):
+        BaseException.__init__(self)
+        self.value = value
+
+
+class Task(object):
+    def __init__(self, generator):
+        self.stack = [generator]
+        self.waiting = None
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def get(self):
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+        return self.result
+
+
+class Dispatcher(object):
+    """
+    Runs many netwise conversations from a single thread.
+
+    A task is a generator, it may yield:
+     - (netwise, request) pair, where request was sent by netwise.send(),
+       task is resumed once response for that request has been read;
+     - another task generator, task is resumed with the value the nested
+       task returned by raising Return(value), errors are propagated.
+
+    While a task waits for response other tasks proceed, sockets of the
+    waiting connections are polled with select(), whatever a readable
+    socket has is appended to its frame, and the response is parsed once
+    the frame is complete, so a slow response does not hold the others.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.ready = deque()
+        self.blocked = []
+
+    def spawn(self, generator):
+        task = Task(generator)
+        self.ready.append((task, None, None))
+        return task
+
+    def run(self, *generators):
+        """
+        Runs given tasks (and tasks spawned earlier) to completion and
+        returns their results, the first failure is re-raised after all
+        tasks are finished
+        """
+        tasks = [self.spawn(generator) for generator in generators]
+        while self.ready or self.blocked:
+            while self.ready:
+                self._step(*self.ready.popleft())
+            if self.blocked:
+                self._poll()
+        return [task.get() for task in tasks]
+
+    def _step(self, task, value, error):
+        while True:
+            generator = task.stack[-1]
+            try:
+                if error is not None:
+                    (exc_type, exc_value, exc_tb) = error
+                    error = None
+                    yielded = generator.throw(exc_type, exc_value, exc_tb)
+                else:
+                    yielded = generator.send(value)
+            except Return, e:
+                task.stack.pop()
+                value = e.value
+            except StopIteration:
+                task.stack.pop()
+                value = None
+            except Exception:
+                task.stack.pop()
+                value = None
+                error = sys.exc_info()
+            else:
+                if isinstance(yielded, types.GeneratorType):
+                    task.stack.append(yielded)
+                    value = None
+                    continue
+                if not isinstance(yielded, tuple) or len(yielded) != 2:
+                    error = (TypeError, TypeError("Unexpected value yielded by task: %r" % (yielded,)), None)
+                    continue
+                request = yielded[1]
+                if request.response is not None:
+                    value = request.response
+                    continue
+                task.waiting = yielded
+                self.blocked.append(task)
+                return
+            if not task.stack:
+                task.done = True
+                task.result = value
+                task.error = error
+                return
+
+    def _poll(self):
+        connections = {}
+        for task in self.blocked:
+            netwise = task.waiting[0]
+            connections[netwise.socket] = netwise
+
+        # data already decrypted by SSL layer is not seen by select()
+        readable = [sock for sock in connections if _buffered(sock)]
+        if not readable:
+            readable = select.select(connections.keys(), [], [], self.timeout)[0]
+        if not readable:
+            self._fail(connections.values(), RuntimeError("Timed out waiting for response"))
+            return
+
+        for sock in readable:
+            netwise = connections[sock]
+            try:
+                netwise._feed()
+            except Exception, e:
+                self._fail([netwise], e)
+
+        blocked = []
+        for task in self.blocked:
+            request = task.waiting[1]
+            if request.response is None:
+                blocked.append(task)
+            else:
+                task.waiting = None
+                self.ready.append((task, request.response, None))
+        self.blocked = blocked
+
+    def _fail(self, connections, error):
+        blocked = []
+        for task in self.blocked:
+            if task.waiting[0] in connections:
+                task.waiting = None
+                self.ready.append((task, None, (type(error), error, None)))
+            else:
+                blocked.append(task)
+        self.blocked = blocked
+
+
+def _buffered(sock):
+    pending = getattr(sock, 'pending', None)
+    if pending is None:
+        return False
+    try:
+        return pending() > 0
+    except Exception:
+        return False
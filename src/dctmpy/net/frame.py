@@ -0,0 +1,116 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+from dctmpy.exceptions import ProtocolException
+
+HEADER_SIZE = 4
+
+try:
+    memoryview
+except NameError:
+    # python 2.6, frames are filled by slice assignment
+    memoryview = None
+
+
+class FrameReader(object):
+    """
+    Reads length-prefixed netwise frames from a connected socket.
+
+    Frame is preallocated using the length taken from the 4-byte header
+    and then filled in place (by recv_into where memoryview is
+    available, by slice assignment on python 2.6), short reads are
+    retried until the frame is complete. Returned frame includes the
+    length header, so offsets used by response parsers stay the same.
+
+    feed() reads frame incrementally, as much as a single recv() returns,
+    so a caller polling many sockets never waits for a slow one; the
+    frame is then returned by read_frame() without touching socket.
+    """
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.header = bytearray(HEADER_SIZE)
+        # frame being filled by feed() and bytes received so far
+        self.partial = None
+        self.filled = 0
+        self.recv_into = None
+        if memoryview is not None:
+            self.recv_into = getattr(sock, 'recv_into', None)
+
+    def read_frame(self):
+        if self.filled < HEADER_SIZE:
+            self._fill(self.header, self.filled, HEADER_SIZE)
+            self.filled = HEADER_SIZE
+        if self.partial is None:
+            self._allocate()
+        (frame, filled) = (self.partial, self.filled)
+        (self.partial, self.filled) = (None, 0)
+        self._fill(frame, filled, len(frame))
+        return frame
+
+    def feed(self):
+        """
+        Reads available part of the next frame by a single recv(),
+        returns True once the frame is complete
+        """
+        if self.filled < HEADER_SIZE:
+            self.filled += self._recv(self.header, self.filled, HEADER_SIZE)
+            if self.filled < HEADER_SIZE:
+                return False
+            self._allocate()
+        elif self.filled < len(self.partial):
+            self.filled += self._recv(self.partial, self.filled, len(self.partial))
+        return self.filled == len(self.partial)
+
+    def _allocate(self):
+        self.partial = bytearray(HEADER_SIZE + self._length())
+        self.partial[0:HEADER_SIZE] = self.header
+
+    def read_length(self):
+        """
+        Reads header of the next frame, returns length of its body
+        """
+        if self.filled != 0:
+            raise ProtocolException("Frame is already being read")
+        self._fill(self.header, 0, HEADER_SIZE)
+        return self._length()
+
+    def _length(self):
+        length = 0
+        for i in xrange(0, HEADER_SIZE):
+            length = length << 8 | self.header[i]
+        return length
+
+    def _fill(self, data, offset, stop):
+        while offset < stop:
+            offset += self._recv(data, offset, stop)
+
+    def _recv(self, data, offset, stop):
+        if self.recv_into:
+            read = self.recv_into(memoryview(data)[offset:stop], stop - offset)
+        else:
+            chunk = self.socket.recv(stop - offset)
+            read = len(chunk)
+            data[offset:offset + read] = chunk
+        if read == 0:
+            raise ProtocolException("Connection closed, %d bytes of %d left unread" % (stop - offset, stop))
+        return read
+
+
+class FrameStream(object):
+    """
+    Frame whose body is read from socket on demand rather than at once,
+    see dctmpy.net.response.StreamingResponse
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.remaining = reader.read_length()
+
+    def read(self, size):
+        size = min(size, self.remaining)
+        data = bytearray(size)
+        self.reader._fill(data, 0, size)
+        self.remaining -= size
+        return data
@@ -8,10 +8,14 @@ except:
     pass
 import socket
 import ssl
+from collections import deque
+
+from dctmpy.net.frame import FrameReader
 
 
 class Netwise(object):
-    attributes = ['version', 'release', 'inumber', 'sequence', 'host', 'port', 'secure', 'sslopts', 'socket']
+    attributes = ['version', 'release', 'inumber', 'sequence', 'host', 'port', 'secure', 'sslopts', 'socket',
+                  'zero_copy']
 
     def __init__(self, **kwargs):
         for attribute in Netwise.attributes:
@@ -21,6 +25,9 @@ class Netwise(object):
         if self.sequence is None:
             self.sequence = 0
         self.socket = None
+        self.reader = None
+        self.pending = deque()
+        self.stream = None
 
     def _connected(self):
         if not self.socket:
@@ -55,6 +62,7 @@ class Netwise(object):
                 else:
                     self.socket = None
                     raise
+            self.reader = FrameReader(self.socket)
         return self.socket
 
     def disconnect(self):
@@ -63,18 +71,67 @@ class Netwise(object):
                 self.socket.close()
         finally:
             self.socket = None
+            self.reader = None
+            self.pending.clear()
+            self.stream = None
 
     def __del__(self):
         self.disconnect()
 
     def request(self, cls, **kwargs):
+        return self.receive(self.send(cls, **kwargs))
+
+    def send(self, cls, **kwargs):
+        """
+        Sends request without waiting for response, response is read
+        later by receive(). Responses arrive in the same order requests
+        were sent, so any request issued meanwhile reads and keeps
+        responses of the requests sent before it.
+        """
         sequence = kwargs.get('sequence', None)
         if sequence is None:
             sequence = self.sequence = self.sequence + 1
-        return cls(**dict(kwargs, **{
-            'socket': self._socket(),
+        sock = self._socket()
+        request = cls(**dict(kwargs, **{
+            'socket': sock,
+            'reader': self.reader,
+            'zero_copy': self.zero_copy,
             'sequence': sequence,
             'version': self.version,
             'release': self.release,
             'inumber': self.inumber,
-        })).receive()
+        }))
+        self.pending.append(request)
+        return request
+
+    def receive(self, request):
+        while request.response is None:
+            if not self.pending:
+                raise RuntimeError("No response expected for request %d" % request.sequence)
+            self._receive_next()
+        return request.response
+
+    def _feed(self):
+        """
+        Reads what has arrived for the next response without waiting for
+        the rest, the response is parsed once its frame is complete and
+        True is returned. Streamed responses are read as by receive(),
+        their header is short and the rest is pulled later.
+        """
+        if self.stream is None and not self.pending[0].streaming:
+            if not self.reader.feed():
+                return False
+        self._receive_next()
+        return True
+
+    def _receive_next(self):
+        if self.stream is not None:
+            # socket is needed for the next response, the rest of the
+            # streamed one is kept in memory
+            self.stream.drain()
+            self.stream = None
+        pending = self.pending.popleft()
+        pending.response = pending.receive()
+        if pending.streaming:
+            self.stream = pending.response
+        return pending
@@ -4,14 +4,15 @@
 #
 from dctmpy.exceptions import ProtocolException
 from dctmpy.net import *
-from dctmpy.net.response import Response, DownloadResponse, UploadResponse
-
-HEADER_SIZE = 4
-BUFFER_SIZE = 65536
+from dctmpy.net.frame import FrameReader, FrameStream, HEADER_SIZE
+from dctmpy.net.response import Response, DownloadResponse, UploadResponse, StreamingResponse
 
 
 class Request(object):
-    attributes = ['version', 'release', 'inumber', 'sequence', 'socket', 'type']
+    attributes = ['version', 'release', 'inumber', 'sequence', 'socket', 'reader', 'type', 'zero_copy']
+
+    # response is read from socket by parts, see StreamingRequest
+    streaming = False
 
     def __init__(self, **kwargs):
         for attribute in Request.attributes:
@@ -23,40 +24,30 @@ class Request(object):
         if self.type is None:
             raise ProtocolException("Invalid request type")
 
+        if self.reader is None:
+            self.reader = FrameReader(self.socket)
+
+        self.response = None
+
         data = kwargs.pop('data', None)
 
         if data is None:
             self.data = None
         else:
-            self.data = serialize_data(data)
+            self.data = data_segments(data)
 
         self.send()
 
     def send(self):
-        self.socket.sendall(
-            str(self._build_request())
-        )
+        self.socket.sendall(self._build_request())
 
     def receive(self):
         return self._receive(Response)
 
     def _receive(self, cls):
-        message = bytearray(self.socket.recv(max(BUFFER_SIZE, HEADER_SIZE + 2)))
-        if len(message) < HEADER_SIZE + 2:
-            raise ProtocolException("Unable to read header")
-
-        message_length = 0
-        for i in xrange(0, HEADER_SIZE):
-            message_length = message_length << 8 | message[i]
-
-        if message[HEADER_SIZE] != PROTOCOL_VERSION:
-            raise ProtocolException("Wrong protocol 0x%X expected 0x%X" % (message[HEADER_SIZE], PROTOCOL_VERSION))
-        header_length = message[HEADER_SIZE + 1]
-
-        while len(message) < HEADER_SIZE + 2 + header_length:
-            message.extend(self.socket.recv(BUFFER_SIZE))
+        (message, offset) = self._read_frame()
 
-        (sequence, offset) = read_integer(message, HEADER_SIZE + 2)
+        (sequence, offset) = read_integer(message, offset)
         if sequence != self.sequence:
             raise ProtocolException("Invalid sequence %d expected %d" % (sequence, self.sequence))
 
@@ -64,24 +55,42 @@ class Request(object):
         if status != 0:
             raise ProtocolException("Bad status: 0x%X" % status)
 
-        bytes_to_read = message_length - len(message) + HEADER_SIZE
-        while bytes_to_read > 0:
-            chunk = bytearray(self.socket.recv(bytes_to_read))
-            bytes_to_read -= len(chunk)
-            message.extend(chunk)
-            if len(chunk) == 0:
-                break
         return cls(**{
             'message': message,
-            'offset': offset
+            'offset': offset,
+            'zero_copy': self.zero_copy,
         })
 
+    def _check_status(self, message, offset):
+        (sequence, offset) = read_integer(message, offset)
+        if sequence != self.sequence:
+            raise ProtocolException("Invalid sequence %d expected %d" % (sequence, self.sequence))
+
+        (status, offset) = read_integer(message, offset)
+        if status != 0:
+            raise ProtocolException("Bad status: 0x%X" % status)
+        return offset
+
+    def _read_frame(self):
+        message = self.reader.read_frame()
+        if len(message) < HEADER_SIZE + 2:
+            raise ProtocolException("Unable to read header")
+
+        if message[HEADER_SIZE] != PROTOCOL_VERSION:
+            raise ProtocolException("Wrong protocol 0x%X expected 0x%X" % (message[HEADER_SIZE], PROTOCOL_VERSION))
+        header_length = message[HEADER_SIZE + 1]
+
+        if len(message) < HEADER_SIZE + 2 + header_length:
+            raise ProtocolException("Unable to read header")
+
+        return message, HEADER_SIZE + 2
+
     def _build_request(self):
-        data = bytearray(4)
-        data.extend(self._build_header())
+        segments = [self._build_header()]
         if self.data:
-            data.extend(self.data)
-        length = len(data) - 4
+            segments.extend(self.data)
+        length = sum(len(x) for x in segments)
+        data = join_segments(segments, bytearray(HEADER_SIZE + length), HEADER_SIZE)
         data[3] = length & 0x000000ff
         data[2] = (length >> 8) & 0x000000ff
         data[1] = (length >> 16) & 0x000000ff
@@ -108,6 +117,38 @@ class DownloadRequest(Request):
         return self._receive(DownloadResponse)
 
 
+class StreamingRequest(Request):
+    """
+    Request for RPC whose response starts with a string (RPC_MULTI_NEXT,
+    RPC_GET_NEXT_PIECE): receive() returns as soon as response header has
+    arrived, the string is then pulled from socket by read() of the
+    returned StreamingResponse
+    """
+
+    streaming = True
+
+    def __init__(self, **kwargs):
+        super(StreamingRequest, self).__init__(**kwargs)
+
+    def receive(self):
+        response = StreamingResponse(**{
+            'message': bytearray(),
+            'offset': 0,
+            'zero_copy': self.zero_copy,
+            'frame': FrameStream(self.reader),
+            'rpc': self.type,
+        })
+        response._need(2)
+        if len(response.message) < 2:
+            raise ProtocolException("Unable to read header")
+        if response.message[0] != PROTOCOL_VERSION:
+            raise ProtocolException("Wrong protocol 0x%X expected 0x%X" % (response.message[0], PROTOCOL_VERSION))
+        # header, sequence, status and the beginning of string
+        response._need(2 + response.message[1] + 12)
+        response.offset = self._check_status(response.message, 2)
+        return response
+
+
 class UploadRequest(Request):
     def __init__(self, **kwargs):
         super(UploadRequest, self).__init__(**kwargs)
@@ -129,38 +170,18 @@ class UploadRequest(Request):
         return header
 
     def _receive(self, cls):
-        message = bytearray(self.socket.recv(max(BUFFER_SIZE, HEADER_SIZE + 2)))
-        if len(message) < HEADER_SIZE + 2:
-            raise ProtocolException("Unable to read header")
+        (message, offset) = self._read_frame()
 
-        message_length = 0
-        for i in xrange(0, HEADER_SIZE):
-            message_length = message_length << 8 | message[i]
-
-        if message[HEADER_SIZE] != PROTOCOL_VERSION:
-            raise ProtocolException("Wrong protocol 0x%X expected 0x%X" % (message[HEADER_SIZE], PROTOCOL_VERSION))
-        header_length = message[HEADER_SIZE + 1]
-
-        while len(message) < HEADER_SIZE + 2 + header_length:
-            message.extend(self.socket.recv(BUFFER_SIZE))
-
-        (sequence, offset) = read_integer(message, HEADER_SIZE + 2)
+        (sequence, offset) = read_integer(message, offset)
 
         (rpc, offset) = read_integer(message, offset)
         if rpc not in CHUNKS:
             raise ProtocolException("Unknown callback rpc: 0x%X" % rpc)
 
-        bytes_to_read = message_length - len(message) + HEADER_SIZE
-        while bytes_to_read > 0:
-            chunk = bytearray(self.socket.recv(bytes_to_read))
-            bytes_to_read -= len(chunk)
-            message.extend(chunk)
-            if len(chunk) == 0:
-                break
-
         return cls(**{
             'sequence': sequence,
             'rpc': rpc,
             'message': message,
-            'offset': offset
+            'offset': offset,
+            'zero_copy': self.zero_copy,
         })
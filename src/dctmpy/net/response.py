@@ -7,7 +7,7 @@ from dctmpy.net import *
 
 
 class Response(object):
-    attributes = ['message', 'offset']
+    attributes = ['message', 'offset', 'zero_copy']
 
     def __init__(self, **kwargs):
         for attribute in Response.attributes:
@@ -17,7 +17,9 @@ class Response(object):
             raise ProtocolException("Response undefined")
 
     def _read_string(self):
-        (result, self.offset) = read_string(self.message, self.offset)
+        (result, self.offset) = read_string(self.message, self.offset, self.zero_copy)
+        if self.zero_copy:
+            return result
         return buffer(result)
 
     def _read_integer(self):
@@ -51,7 +53,7 @@ class DownloadResponse(Response):
         super(DownloadResponse, self).__init__(**kwargs)
 
     def _read_string(self):
-        (result, self.offset) = read_binary(self.message, self.offset)
+        (result, self.offset) = read_binary(self.message, self.offset, self.zero_copy)
         return result
 
 
@@ -62,3 +64,94 @@ class UploadResponse(Response):
         for attribute in UploadResponse.attributes:
             setattr(self, attribute, kwargs.pop(attribute, None))
         super(UploadResponse, self).__init__(**kwargs)
+
+
+class StreamingResponse(Response):
+    """
+    Response whose leading string argument is not read in advance:
+    read() pulls it from socket part by part and returns empty string
+    once it is over, arguments following the string are then available
+    via next(). Strings split into segments (STRING_ARRAY_START) are
+    returned as a single one.
+    """
+
+    attributes = ['frame', 'rpc']
+
+    def __init__(self, **kwargs):
+        for attribute in StreamingResponse.attributes:
+            setattr(self, attribute, kwargs.pop(attribute, None))
+        super(StreamingResponse, self).__init__(**kwargs)
+        self.left = 0
+        self.started = False
+        self.segmented = False
+        self.done = False
+
+    def read(self, size):
+        while not self.done:
+            if self.left == 0:
+                self._next_segment()
+                continue
+            chunk = self._take(min(size, self.left))
+            self.left -= len(chunk)
+            # segments are NUL-terminated strings, see read_array()
+            if self.left == 0 and chunk[-1] == NULL_BYTE:
+                chunk = chunk[:-1]
+            if len(chunk) > 0:
+                return str(chunk)
+        return ""
+
+    def drain(self):
+        """
+        Reads the rest of frame into memory, so socket may be used for
+        other responses, read() still works afterwards
+        """
+        self._need(len(self.message) - self.offset + self.frame.remaining)
+
+    def _next_segment(self):
+        if self.started and not self.segmented:
+            self._end()
+            return
+        self._need(6)
+        if len(self.message) - self.offset < 2:
+            raise ProtocolException("Unexpected end of string")
+        seq1 = self.message[self.offset]
+        seq2 = self.message[1 + self.offset]
+        self.started = True
+        if self.segmented and seq1 == NULL_BYTE and seq2 == NULL_BYTE:
+            self.offset += 2
+            self._end()
+        elif not self.segmented and seq1 == STRING_ARRAY_START and seq2 == 0x80:
+            self.offset += 2
+            self.segmented = True
+        elif seq1 == EMPTY_STRING_START and seq2 == NULL_BYTE:
+            self.offset += 2
+        elif seq1 == STRING_START:
+            (self.left, self.offset) = read_length(self.message, self.offset + 1)
+        else:
+            raise ProtocolException("Unknown sequence: 0x%X" % seq1)
+
+    def _end(self):
+        self.done = True
+        self.drain()
+
+    def _take(self, size):
+        available = len(self.message) - self.offset
+        if available == 0:
+            if self.frame.remaining == 0:
+                raise ProtocolException("Unexpected end of string, %d bytes left unread" % self.left)
+            return self.frame.read(size)
+        size = min(size, available)
+        chunk = self.message[self.offset:self.offset + size]
+        self.offset += size
+        if self.offset == len(self.message):
+            self.message = bytearray()
+            self.offset = 0
+        return chunk
+
+    def _need(self, size):
+        missing = size - (len(self.message) - self.offset)
+        if missing > 0 and self.frame.remaining > 0:
+            if self.offset > 0:
+                self.message = self.message[self.offset:]
+                self.offset = 0
+            self.message.extend(self.frame.read(missing))
@@ -3,6 +3,7 @@
 #  See main module for license.
 #
 R_OBJECT_ID = "r_object_id"
+I_VSTAMP = "i_vstamp"
 R_PAGE_CNT = "r_page_cnt"
 STORAGE_ID = "storage_id"
 FORMAT = "format"
@@ -1,9 +1,16 @@
 class AttrInfo(object):
-    attributes = ['position', 'name', 'type', 'repeating', 'length', 'restriction', 'extended']
+    __slots__ = ('position', 'name', 'type', 'repeating', 'length', 'restriction', 'extended')
 
-    def __init__(self, **kwargs):
-        for attribute in AttrInfo.attributes:
-            setattr(self, attribute, kwargs.pop(attribute, None))
+    def __init__(self, position=None, name=None, type=None, repeating=None, length=None,
+                 restriction=None, extended=None):
+        self.position = position
+        self.name = name
+        self.type = type
+        self.repeating = repeating
+        self.length = length
+        self.restriction = restriction
+        self.extended = extended
 
     def clone(self):
-        return AttrInfo(**dict((x, getattr(self, x)) for x in AttrInfo.attributes))
+        return AttrInfo(self.position, self.name, self.type, self.repeating, self.length,
+                        self.restriction, self.extended)
@@ -2,20 +2,53 @@ from dctmpy import as_list
 
 
 class AttrValue(object):
-    attributes = ['name', 'type', 'length', 'repeating', 'values', 'extended']
+    """
+    Value of a single attribute. Values of repeating attributes are kept
+    in a list, single attributes keep their only value as is.
+    """
+    __slots__ = ('name', 'type', 'length', 'extended', '_repeating', '_value')
 
-    def __init__(self, **kwargs):
-        for attribute in AttrValue.attributes:
-            setattr(self, attribute, kwargs.pop(attribute, None))
-        self.values = as_list(self.values)
-        if self.repeating is None:
-            self.repeating = False
-        if self.length is None:
-            self.length = 0
+    def __init__(self, name=None, type=None, length=0, repeating=False, values=None, extended=None):
+        self.name = name
+        self.type = type
+        if length is None:
+            length = 0
+        self.length = length
+        self.extended = extended
+        self._repeating = bool(repeating)
+        self.values = values
+
+    def _get_repeating(self):
+        return self._repeating
+
+    def _set_repeating(self, repeating):
+        values = self.values
+        self._repeating = bool(repeating)
+        self.values = values
+
+    repeating = property(_get_repeating, _set_repeating)
+
+    def _get_values(self):
+        if self._repeating:
+            return self._value
+        return [self._value]
+
+    def _set_values(self, values):
+        if self._repeating:
+            self._value = as_list(values)
+        elif isinstance(values, list):
+            if len(values) > 0:
+                self._value = values[0]
+            else:
+                self._value = None
+        else:
+            self._value = values
+
+    values = property(_get_values, _set_values)
 
     def __len__(self):
-        if self.repeating:
-            return len(self.values)
+        if self._repeating:
+            return len(self._value)
         return 1
 
     def __getitem__(self, key):
@@ -23,29 +56,64 @@ class AttrValue(object):
             return [self[x] for x in xrange(*key.indices(len(self)))]
         if not isinstance(key, int):
             raise TypeError("Invalid argument type")
-        if self.repeating:
-            if key > len(self.values):
+        if self._repeating:
+            if key > len(self._value):
                 raise KeyError
-            return self.values[key]
+            return self._value[key]
         if key > 0:
             raise KeyError
-        if len(self.values) == 0:
-            return None
-        return self.values[0]
+        return self._value
 
     def __iter__(self):
-        class Iterator(object):
-            def __init__(self, obj):
-                self.obj = obj
-                self.index = -1
+        if self._repeating:
+            return iter(self._value)
+        return iter([self._value])
+
+
+class LazyAttrValue(AttrValue):
+    """
+    Value which is decoded from serialized object on first access,
+    source is the object it belongs to, see TypedObject._read_lazy()
+    """
+    __slots__ = ('_source', '_offset', '_reader')
 
-            def __iter__(self):
-                return self
+    def __init__(self, name, type, length, repeating, extended, source, offset, reader):
+        self.name = name
+        self.type = type
+        if length is None:
+            length = 0
+        self.length = length
+        self.extended = extended
+        self._repeating = bool(repeating)
+        self._value = None
+        self._source = source
+        self._offset = offset
+        self._reader = reader
 
-            def next(self):
-                if self.index >= len(self.obj):
-                    raise StopIteration
-                self.index += 1
-                return self.obj[self.index]
+    def _decode(self):
+        source = self._source
+        if source is not None:
+            self._source = None
+            AttrValue._set_values(self, source._read_lazy(self._offset, self._reader, self._repeating))
 
-        return Iterator(self)
+    def _get_values(self):
+        self._decode()
+        return AttrValue._get_values(self)
+
+    def _set_values(self, values):
+        self._source = None
+        AttrValue._set_values(self, values)
+
+    values = property(_get_values, _set_values)
+
+    def __len__(self):
+        self._decode()
+        return AttrValue.__len__(self)
+
+    def __getitem__(self, key):
+        self._decode()
+        return AttrValue.__getitem__(self, key)
+
+    def __iter__(self):
+        self._decode()
+        return AttrValue.__iter__(self)
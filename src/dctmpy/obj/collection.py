@@ -3,18 +3,44 @@
 # See main module for license.
 #
 
+import sys
+import time
+from collections import deque
+
 from dctmpy import *
 from dctmpy.exceptions import ParserException
+from dctmpy.net import join_segments
+from dctmpy.obj.columns import ColumnSet
 from dctmpy.obj.typedobject import TypedObject
 
+STREAM_CHUNK_SIZE = 65536
+
 
 class Collection(TypedObject):
-    attributes = ['collection', 'batch_size', 'record_count', 'may_be_more', 'persistent']
+    attributes = ['collection', 'batch_size', 'record_count', 'may_be_more', 'persistent', 'prefetch',
+                  'batch_sizer', 'intern_strings', 'streaming']
 
     def __init__(self, **kwargs):
         for attribute in Collection.attributes:
             setattr(self, attribute, kwargs.pop(attribute, None))
+        if self.prefetch is None:
+            self.prefetch = getattr(kwargs.get('session', None), 'prefetch', 0)
+        if self.batch_sizer is None:
+            self.batch_sizer = getattr(kwargs.get('session', None), 'batch_sizer', None)
+        if self.intern_strings is None:
+            self.intern_strings = getattr(kwargs.get('session', None), 'intern_strings', None)
+        if self.streaming is None:
+            self.streaming = getattr(kwargs.get('session', None), 'streaming', False)
+        self.pending = deque()
+        self.stream = None
+        self.streamed = 0
         super(Collection, self).__init__(**kwargs)
+        # STRING values of all records share a single table
+        if self.strings is None and self.intern_strings:
+            if self.intern_strings is True:
+                self.strings = StringTable()
+            else:
+                self.strings = StringTable(self.intern_strings)
 
     def _need_read_type(self):
         return True
@@ -22,34 +48,208 @@ class Collection(TypedObject):
     def _need_read_object(self):
         return False
 
-    def next_record(self):
+    def _has_next(self, streaming=True):
         if self.collection is None:
-            return None
+            return False
+
+        if self._need_batch():
+            # batches requested ahead are read whole, streaming needs
+            # the response to be the next one on socket
+            if streaming and self.streaming and not self.prefetch:
+                self._open_stream()
+            else:
+                self._load_batch(self._next_batch())
+
+        return self._has_records()
 
-        if self._is_empty() and (self.may_be_more is None or self.may_be_more):
+    def _need_batch(self):
+        return self.stream is None and self._is_empty() and (self.may_be_more is None or self.may_be_more)
+
+    def _has_records(self):
+        while self.stream is not None and self._is_empty():
+            self._pull_stream()
+        return not self._is_empty() and (self.record_count is None or self.record_count > 0)
+
+    def _load_batch(self, response):
+        pieces = response.pieces
+        self.buffer = None
+        if pieces:
+            self.buffer = pieces[0]
+        self.offset = 0
+        self.record_count = response.record_count
+        self.may_be_more = response.may_be_more
+        if len(pieces) > 1:
+            # continuation pieces are parsed as a stream, not joined
+            self.stream = PieceStream(pieces[1:])
+            self.stream_length = 0
+            self.streamed = 0
+            if self.ser_version > 0:
+                self._read_streamed(self._read_int)
+        elif self.ser_version > 0 and not self._is_empty():
+            self._read_int()
+
+    def _next_batch(self):
+        started = time.time()
+        if not self.prefetch:
             response = self.session.next_batch(self.collection, self.batch_size)
-            self.buffer = response.data
-            self.record_count = response.record_count
-            self.may_be_more = response.may_be_more
-            if self.ser_version > 0 and not is_empty(self.buffer):
-                self._read_int()
+        else:
+            if not self.pending:
+                self.pending.append(self.session.prefetch_batch(self.collection, self.batch_size))
+            response = self.session.next_batch(self.collection, self.batch_size, self.pending.popleft())
+        if self.batch_sizer and response.may_be_more:
+            self.batch_size = self.batch_sizer.next_size(
+                self.batch_size, response.length, response.record_count, time.time() - started)
+        # ask for the following batch before this one gets parsed; batch
+        # with continuation pieces must be the last request on the wire,
+        # so no more than one batch is requested ahead
+        if self.prefetch and response.may_be_more and not self.pending:
+            self.pending.append(self.session.prefetch_batch(self.collection, self.batch_size))
+        return response
+
+    def _open_stream(self):
+        """
+        Starts streamed batch: records are parsed as soon as they arrive,
+        only the part of batch not parsed yet is kept in buffer
+        """
+        self.stream = self.session.stream_batch(self.collection, self.batch_size)
+        self.stream_started = time.time()
+        self.stream_length = 0
+        self.streamed = 0
+        self.buffer = ""
+        self.offset = 0
+        self.record_count = None
+        if self.ser_version > 0 and self._has_records():
+            self._read_streamed(self._read_int)
+
+    def _pull_stream(self, size=STREAM_CHUNK_SIZE):
+        chunk = self.stream.read(size)
+        if chunk:
+            self.stream_length += len(chunk)
+            if self._is_empty():
+                self.buffer = chunk
+            else:
+                self.buffer = buffer(join_segments([self.buffer[self.offset:], chunk]))
+            self.offset = 0
+            return
+        if isinstance(self.stream, PieceStream):
+            # counters of the batch are known already
+            self.stream = None
+            return
+        (response, self.stream) = self.session.end_stream(self.stream)
+        # result of RPC_MULTI_NEXT, continuation pieces have no counters
+        if response.record_count is None:
+            return
+        self.record_count = response.record_count - self.streamed
+        self.may_be_more = response.may_be_more
+        if self.batch_sizer and response.may_be_more:
+            self.batch_size = self.batch_sizer.next_size(
+                self.batch_size, self.stream_length, response.record_count, time.time() - self.stream_started)
 
-        if not self._is_empty() and (self.record_count is None or self.record_count > 0):
+    def _drain_stream(self):
+        while self.stream is not None:
+            self._pull_stream(sys.maxint)
+
+    def _read_streamed(self, read):
+        """
+        Calls read() against the part of streamed batch received so far,
+        more data is pulled until read() either stops short of the end of
+        buffer, i.e. was not cut off, or batch is over
+        """
+        while True:
+            offset = self.offset
+            length = len(self.buffer)
+            try:
+                result = read()
+                if self.offset < len(self.buffer) or self.stream is None:
+                    return result
+            except Exception:
+                if self.stream is None:
+                    raise
+            self.offset = offset
+            # record does not fit, ask for more than buffered at once
+            self._pull_stream(max(STREAM_CHUNK_SIZE, length - offset))
+
+    def _read_entry(self):
+        cls = [CollectionEntry, PersistentCollectionEntry][self.persistent]
+        entry = cls(session=self.session, type=self.type, buffer=self.buffer, offset=self.offset,
+                    lazy=self.lazy, projection=self.projection, floats=self.floats,
+                    compact_ids=self.compact_ids, strings=self.strings)
+        self.offset = entry.offset
+        return entry
+
+    def next_record(self):
+        if self.collection is None:
+            return None
+
+        if self._has_next():
             try:
-                cls = [CollectionEntry, PersistentCollectionEntry][self.persistent]
-                entry = cls(session=self.session, type=self.type, buffer=self.buffer)
-                self.buffer = entry.buffer
-                entry.buffer = None
+                if self.stream is None:
+                    entry = self._read_entry()
+                else:
+                    entry = self._read_streamed(self._read_entry)
+                    self.streamed += 1
+                # lazy entries decode values from batch buffer later
+                if not entry.lazy:
+                    entry.buffer = None
                 return entry
             finally:
                 if self.record_count is not None:
                     self.record_count -= 1
         try:
             self.close()
-        except Exception, e:
+        except:
             pass
         return None
 
+    def fetch_columns(self, attrs=None, limit=None):
+        """
+        Reads remaining records (at most limit of them) straight into
+        per-attribute columns, see dctmpy.obj.columns, without building
+        record objects. If attrs is specified only those attributes are
+        kept.
+        """
+        columns = ColumnSet(attrs)
+        if self.collection is None:
+            return columns.finish()
+
+        cls = [ColumnEntry, PersistentColumnEntry][self.persistent]
+        # DOUBLE values go to array('d') anyway, Decimal is not needed
+        reader = cls(session=self.session, type=self.type, columns=columns, lazy=False, projection=attrs,
+                     floats=True, compact_ids=False)
+
+        while limit is None or columns.rows < limit:
+            if not self._has_next(False):
+                try:
+                    self.close()
+                except:
+                    pass
+                break
+            # partially read record can't be taken back from columns, so
+            # batches are read whole
+            self._drain_stream()
+            try:
+                reader.buffer = self.buffer
+                reader.offset = self.offset
+                reader._read()
+                self.offset = reader.offset
+                columns.end_row()
+            finally:
+                if self.record_count is not None:
+                    self.record_count -= 1
+        reader.buffer = None
+        return columns.finish()
+
+    def project(self, attrs):
+        """
+        Makes following records decode only given attributes, the rest
+        is skipped: for record in collection.project(['r_object_id'])
+        """
+        if attrs is None:
+            self.projection = None
+        else:
+            self.projection = frozenset(attrs)
+        return self
+
     def __iter__(self):
         class iterator(object):
             def __init__(self, obj):
@@ -72,6 +272,15 @@ class Collection(TypedObject):
     def close(self):
         if self.collection >= 0:
             try:
+                # batches requested ahead are read whole (pieces, server
+                # messages) and dropped before collection gets closed
+                while self.pending:
+                    request = self.pending.popleft()
+                    try:
+                        self.session.next_batch(self.collection, self.batch_size, request)
+                    except:
+                        pass
+                self._drain_stream()
                 self.session.close_collection(self.collection)
             except:
                 pass
@@ -82,15 +291,64 @@ class Collection(TypedObject):
         self.close()
 
 
+class BatchSizer(object):
+    """
+    Adaptive batch hint for collections: after every batch the hint is
+    moved toward batches of about target_size bytes, judging by the
+    bytes per record seen in that batch. Batches that took longer than
+    max_latency seconds shrink the hint proportionally, the hint never
+    grows more than four times at once and stays within
+    [min_size, max_size].
+    """
+
+    def __init__(self, min_size=DEFAULT_BATCH_SIZE, max_size=10000, target_size=4 * 65536, max_latency=2.0):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_size = target_size
+        self.max_latency = max_latency
+
+    def next_size(self, size, length, records, elapsed):
+        if not records or not length:
+            return size
+        result = self.target_size * records // length
+        if self.max_latency and elapsed > self.max_latency:
+            result = min(result, int(size * self.max_latency / elapsed))
+        result = min(result, size * 4)
+        return max(self.min_size, min(self.max_size, result))
+
+
+class PieceStream(object):
+    """
+    Continuation pieces of a batch read whole, offered to Collection the
+    way streamed batches are, see Collection._pull_stream()
+    """
+
+    def __init__(self, pieces):
+        self.pieces = deque(pieces)
+
+    def read(self, size):
+        chunks = []
+        length = 0
+        while self.pieces and (not chunks or length + len(self.pieces[0]) <= size):
+            chunks.append(self.pieces.popleft())
+            length += len(chunks[-1])
+        if not chunks:
+            return ""
+        if len(chunks) == 1:
+            return chunks[0]
+        return buffer(join_segments(chunks))
+
+
 class PersistentCollection(Collection):
     def __init__(self, **kwargs):
         super(PersistentCollection, self).__init__(**kwargs)
 
     def _read(self, buf=None):
-        if is_empty(buf) and is_empty(self.buffer):
+        if is_empty(buf) and self._is_empty():
             raise ParserException("Empty data")
         if not is_empty(buf):
             self.buffer = buf
+            self.offset = 0
         self.type = self.session.get_type(self._next_string(), 0)
 
     def _need_read_type(self):
@@ -122,3 +380,25 @@ class PersistentCollectionEntry(CollectionEntry):
         super(PersistentCollectionEntry, self)._read(buf)
         if self.ser_version > 0:
             self._read_int()
+
+
+class ColumnEntry(CollectionEntry):
+    """
+    Reads collection records into a ColumnSet instead of own attributes
+    """
+
+    def __init__(self, **kwargs):
+        self.columns = kwargs.pop('columns', None)
+        super(ColumnEntry, self).__init__(**kwargs)
+
+    def _add_attr_value(self, name, attr_type, length, values, repeating, extended):
+        self.columns.add(name, attr_type, repeating, values)
+
+
+class PersistentColumnEntry(PersistentCollectionEntry):
+    def __init__(self, **kwargs):
+        self.columns = kwargs.pop('columns', None)
+        super(PersistentColumnEntry, self).__init__(**kwargs)
+
+    def _add_attr_value(self, name, attr_type, length, values, repeating, extended):
+        self.columns.add(name, attr_type, repeating, values)
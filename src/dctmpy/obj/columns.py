@@ -0,0 +1,211 @@
+#  Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+#  See main module for license.
+#
+from array import array
+
+from dctmpy import *
+
+NAN = float('nan')
+
+
+class Column(object):
+    """
+    Values of a single attribute across fetched records. Values are kept
+    in a typed storage (self.values), repeating attributes additionally
+    keep per-record boundaries in self.offsets: values of record i are
+    stored at [offsets[i], offsets[i + 1]).
+    """
+
+    def __init__(self, name, attr_type, repeating=False):
+        self.name = name
+        self.type = attr_type
+        self.repeating = repeating
+        self.values = self._storage()
+        self.count = 0
+        if repeating:
+            self.offsets = array('L', [0])
+        else:
+            self.offsets = None
+
+    def _storage(self):
+        raise NotImplementedError
+
+    def _append(self, value):
+        raise NotImplementedError
+
+    def _get(self, index):
+        return self.values[index]
+
+    def append(self, values):
+        """
+        Appends values of the next record: a single value for single
+        attributes and a list of values for repeating ones
+        """
+        if not self.repeating:
+            self._append(values)
+            self.count += 1
+            return
+        for value in values:
+            self._append(value)
+            self.count += 1
+        self.offsets.append(self.count)
+
+    def pad(self, rows):
+        while len(self) < rows:
+            if self.repeating:
+                self.append([])
+            else:
+                self.append(None)
+
+    def __len__(self):
+        if self.repeating:
+            return len(self.offsets) - 1
+        return self.count
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("record index out of range")
+        if self.repeating:
+            return [self._get(i) for i in xrange(self.offsets[row], self.offsets[row + 1])]
+        return self._get(row)
+
+    def __iter__(self):
+        for row in xrange(0, len(self)):
+            yield self[row]
+
+
+class IntColumn(Column):
+    def _storage(self):
+        return array('l')
+
+    def _append(self, value):
+        if value is None:
+            value = 0
+        self.values.append(value)
+
+
+class DoubleColumn(Column):
+    def _storage(self):
+        return array('d')
+
+    def _append(self, value):
+        if value is None:
+            value = NAN
+        self.values.append(float(value))
+
+
+class TimeColumn(DoubleColumn):
+    """
+    Seconds since epoch, nulldate is stored as NaN
+    """
+
+    def _get(self, index):
+        value = self.values[index]
+        if value != value:
+            return None
+        return value
+
+
+class BoolColumn(Column):
+    """
+    Values are packed into a bitmap, eight values per byte
+    """
+
+    def _storage(self):
+        return bytearray()
+
+    def _append(self, value):
+        if self.count % 8 == 0:
+            self.values.append(0)
+        if value:
+            self.values[self.count >> 3] |= 1 << (self.count & 7)
+
+    def _get(self, index):
+        return self.values[index >> 3] & (1 << (index & 7)) != 0
+
+
+class StringColumn(Column):
+    """
+    Values are concatenated into a single byte pool, value i occupies
+    pool[bounds[i]:bounds[i + 1]]
+    """
+
+    def __init__(self, name, attr_type, repeating=False):
+        super(StringColumn, self).__init__(name, attr_type, repeating)
+        self.bounds = array('L', [0])
+
+    def _storage(self):
+        return bytearray()
+
+    def _append(self, value):
+        if value:
+            self.values.extend(value)
+        self.bounds.append(len(self.values))
+
+    def _get(self, index):
+        return str(self.values[self.bounds[index]:self.bounds[index + 1]])
+
+
+COLUMN_TYPES = {
+    INT: IntColumn,
+    DOUBLE: DoubleColumn,
+    TIME: TimeColumn,
+    BOOL: BoolColumn,
+    STRING: StringColumn,
+    ID: StringColumn,
+    UNDEFINED: StringColumn,
+}
+
+
+class ColumnSet(object):
+    """
+    Result of Collection.fetch_columns(): columns keyed by attribute
+    name, in the order attributes were first seen.
+    """
+
+    def __init__(self, names=None):
+        self.names = None
+        if names is not None:
+            self.names = set(names)
+        self.columns = {}
+        self.order = []
+        self.rows = 0
+
+    def add(self, name, attr_type, repeating, values):
+        if self.names is not None and name not in self.names:
+            return
+        column = self.columns.get(name, None)
+        if column is None:
+            column = COLUMN_TYPES.get(attr_type, StringColumn)(name, attr_type, repeating)
+            column.pad(self.rows)
+            self.columns[name] = column
+            self.order.append(name)
+        elif len(column) < self.rows:
+            column.pad(self.rows)
+        column.append(values)
+
+    def end_row(self):
+        self.rows += 1
+
+    def finish(self):
+        for column in self.columns.values():
+            column.pad(self.rows)
+        return self
+
+    def keys(self):
+        return list(self.order)
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __iter__(self):
+        return iter(self.order)
@@ -55,16 +55,17 @@ class DocbrokerObject(TypedObject):
             'type': attr_type,
             'length': attr_length,
             'values': result,
-            'repeating': repeating,
+            'repeating': self._is_repeating(attr_name, repeating),
             'extended': False,
         }))
 
+    def _is_repeating(self, attr_name, repeating):
+        return repeating
+
 
 class DocbaseMap(DocbrokerObject):
     def __init__(self, **kwargs):
         super(DocbaseMap, self).__init__(**kwargs)
 
-    def add(self, value):
-        if not value.name in ['i_host_addr']:
-            value.repeating = True
-        super(DocbrokerObject, self).add(value)
+    def _is_repeating(self, attr_name, repeating):
+        return repeating or attr_name not in ['i_host_addr']
@@ -3,6 +3,11 @@
 #  See main module for license.
 #
 
+import json
+import logging
+import os
+import threading
+
 from dctmpy.obj.typedobject import TypedObject
 
 
@@ -32,3 +37,72 @@ class EntryPoints(TypedObject):
         super(EntryPoints, self).__setattr__(name, value)
 
 
+class EntryPointCache(object):
+    """
+    Entry points and known commands of docbases keyed by (host, docbase
+    id), entry is valid only for the server version it was taken from.
+    If path is specified entry points are also kept in that file (JSON),
+    known commands are rebuilt from them after load.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.loaded = path is None
+
+    def get(self, host, docbaseid, version):
+        """
+        Returns (entrypoints, known_commands) or None, known_commands is
+        None for entries read from file
+        """
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.entries.get((host, docbaseid), None)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1], entry[2]
+
+    def put(self, host, docbaseid, version, entrypoints, known_commands=None):
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.entries.get((host, docbaseid), None)
+            self.entries[(host, docbaseid)] = (version, entrypoints, known_commands)
+            if self.path is None or (entry is not None and entry[0] == version and entry[1] == entrypoints):
+                return
+            self._save()
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.entries.update(self._load())
+            self.loaded = True
+
+    def _load(self):
+        entries = {}
+        try:
+            if not os.path.exists(self.path):
+                return entries
+            with open(self.path, 'rb') as f:
+                for entry in json.load(f):
+                    entries[(entry['host'], entry['docbaseid'])] = \
+                        (entry['version'], dict((str(k), v) for (k, v) in entry['entrypoints'].items()), None)
+        except Exception, e:
+            logging.warning("Unable to read entry points cache %s: %s" % (self.path, e))
+        return entries
+
+    def _save(self):
+        data = []
+        for ((host, docbaseid), (version, entrypoints, known_commands)) in self.entries.items():
+            data.append({'host': host, 'docbaseid': docbaseid, 'version': version, 'entrypoints': entrypoints})
+        temp = "%s.%d" % (self.path, os.getpid())
+        try:
+            with open(temp, 'wb') as f:
+                json.dump(data, f)
+            if os.name == 'nt' and os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(temp, self.path)
+        except Exception, e:
+            logging.warning("Unable to write entry points cache %s: %s" % (self.path, e))
+
+
+ENTRY_POINT_CACHE = EntryPointCache()
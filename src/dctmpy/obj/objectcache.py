@@ -0,0 +1,186 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import logging
+import threading
+import time
+
+from dctmpy.obj import I_VSTAMP
+from dctmpy.obj.attrvalue import AttrValue
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 300
+DEFAULT_REVALIDATE = ('dm_format', 'dm_acl', 'dm_folder', 'dm_cabinet')
+
+# slots of LRU list entries
+PREV, NEXT, KEY, OBJECT, STORED = 0, 1, 2, 3, 4
+
+
+class ObjectCache(object):
+    """
+    Thread-safe LRU cache of fetched objects, keyed by docbase id, user
+    name and r_object_id, so an object is handed out only to sessions
+    of the user it was fetched by, permissions are not checked again:
+
+        pool = SessionPool(..., object_cache=ObjectCache(size=512, ttl=60))
+
+    Objects are kept detached: without session and serialized buffer,
+    lazy attributes decoded. get() returns a copy attached to the given
+    session, so callers may modify it. Entries older than ttl seconds
+    (never if 0) are dropped, except for types listed in revalidate:
+    those are kept while i_vstamp read from server matches the cached
+    one. Beyond size entries the least recently used ones are evicted.
+    """
+
+    attributes = ['size', 'ttl', 'revalidate']
+
+    def __init__(self, **kwargs):
+        for attribute in ObjectCache.attributes:
+            setattr(self, attribute, kwargs.pop(attribute, None))
+        if self.size is None:
+            self.size = DEFAULT_CACHE_SIZE
+        if self.ttl is None:
+            self.ttl = DEFAULT_CACHE_TTL
+        if self.revalidate is None:
+            self.revalidate = DEFAULT_REVALIDATE
+        self.revalidate = frozenset(self.revalidate)
+        if self.size < 1:
+            raise RuntimeError("Invalid cache size: %d" % self.size)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+        self.entries = {}
+        # circular list, root.NEXT is the least recently used entry
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None, None]
+
+    def get(self, session, objectid):
+        """
+        Returns cached object attached to session or None if object is
+        not cached (or is outdated)
+        """
+        key = _key(session, objectid)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None and not self._is_expired(entry, now):
+                self._touch(entry)
+                self.hits += 1
+                return _attach(entry[OBJECT], session)
+            if entry is None or not self._can_revalidate(entry[OBJECT]):
+                self._remove(key)
+                self.misses += 1
+                return None
+            obj = entry[OBJECT]
+
+        current = self._is_current(session, obj)
+        with self.lock:
+            self.revalidations += 1
+            entry = self.entries.get(key, None)
+            if entry is None or entry[OBJECT] is not obj:
+                self.misses += 1
+                return None
+            if not current:
+                self._remove(key)
+                self.misses += 1
+                return None
+            entry[STORED] = now
+            self._touch(entry)
+            self.hits += 1
+            return _attach(obj, session)
+
+    def put(self, session, obj):
+        """
+        Stores detached copy of obj fetched by session
+        """
+        if obj is None:
+            return
+        key = _key(session, obj.object_id())
+        detached = _detach(obj)
+        with self.lock:
+            self._remove(key)
+            last = self.root[PREV]
+            entry = [last, self.root, key, detached, time.time()]
+            last[NEXT] = self.root[PREV] = self.entries[key] = entry
+            while len(self.entries) > self.size:
+                self._remove(self.root[NEXT][KEY])
+                self.evictions += 1
+
+    def invalidate(self, session, objectid):
+        with self.lock:
+            self._remove(_key(session, objectid))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.root[:] = [self.root, self.root, None, None, None]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _is_expired(self, entry, now):
+        return self.ttl and now - entry[STORED] > self.ttl
+
+    def _can_revalidate(self, obj):
+        return obj.type is not None and obj.type.name in self.revalidate and I_VSTAMP in obj
+
+    def _is_current(self, session, obj):
+        query = "SELECT %s FROM %s WHERE r_object_id='%s'" % (I_VSTAMP, obj.type.name, obj.object_id())
+        collection = None
+        try:
+            collection = session.query(query)
+            record = collection.next_record()
+            return record is not None and record[I_VSTAMP] == obj[I_VSTAMP]
+        except Exception, e:
+            logging.debug("Unable to revalidate cached object %s: %s" % (obj.object_id(), e))
+            return False
+        finally:
+            if collection:
+                collection.close()
+
+    def _touch(self, entry):
+        (prev, next) = (entry[PREV], entry[NEXT])
+        prev[NEXT] = next
+        next[PREV] = prev
+        last = self.root[PREV]
+        entry[PREV] = last
+        entry[NEXT] = self.root
+        last[NEXT] = self.root[PREV] = entry
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        (prev, next) = (entry[PREV], entry[NEXT])
+        prev[NEXT] = next
+        next[PREV] = prev
+
+
+def _key(session, objectid):
+    return session.docbaseid, getattr(session, 'username', None), str(objectid)
+
+
+def _copy(obj, session):
+    copy = object.__new__(obj.__class__)
+    copy.__dict__.update(obj.__dict__)
+    copy.session = session
+    copy.attrs = dict((name, AttrValue(value.name, value.type, value.length, value.repeating,
+                                       list(value.values), value.extended))
+                      for (name, value) in obj.attrs.iteritems())
+    return copy
+
+
+def _detach(obj):
+    detached = _copy(obj, None)
+    detached.buffer = None
+    detached.initial = None
+    detached.offset = 0
+    detached.strings = None
+    return detached
+
+
+def _attach(obj, session):
+    return _copy(obj, session)
@@ -0,0 +1,143 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+from array import array
+from bisect import bisect_left
+
+from dctmpy import *
+
+
+def _id_typecode():
+    for typecode in ('Q', 'L'):
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+
+# array type holding 64-bit ids, None if platform does not have one
+ID_TYPECODE = _id_typecode()
+
+
+class ObjectId(long):
+    """
+    Object id kept as an integer: type tag is read without parsing, ids
+    are hashed and ordered as integers, str() gives the usual 16 hex
+    digits. ObjectId never equals its string form. Large sets of ids
+    should be kept in ObjectIdList or ObjectIdSet, 8 bytes per id.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, value=None):
+        if not value:
+            return long.__new__(cls, 0)
+        if isinstance(value, basestring):
+            return long.__new__(cls, value, 16)
+        return long.__new__(cls, value)
+
+    @property
+    def tag(self):
+        return int(self >> 56)
+
+    @property
+    def docbase_id(self):
+        return int(self >> 32) & 0xffffff
+
+    def is_null(self):
+        return self == 0
+
+    def serialize(self):
+        return str(self)
+
+    def __str__(self):
+        return "%016x" % self
+
+    def __repr__(self):
+        return "ObjectId('%016x')" % self
+
+
+def _to_long(value):
+    if isinstance(value, basestring):
+        return ObjectId(value)
+    return value
+
+
+def _storage(values=()):
+    if ID_TYPECODE is None:
+        return list(values)
+    return array(ID_TYPECODE, values)
+
+
+class ObjectIdList(object):
+    """
+    List of object ids packed into array, 8 bytes per id; accepts ids
+    both as ObjectId and as strings, returns ObjectId
+    """
+
+    def __init__(self, values=None):
+        self.values = _storage()
+        if values is not None:
+            self.extend(values)
+
+    def append(self, value):
+        self.values.append(_to_long(value))
+
+    def extend(self, values):
+        self.values.extend(_to_long(value) for value in values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return ObjectId(self.values[index])
+
+    def __iter__(self):
+        for value in self.values:
+            yield ObjectId(value)
+
+    def __contains__(self, value):
+        return _to_long(value) in self.values
+
+
+class ObjectIdSet(ObjectIdList):
+    """
+    Set of object ids kept as sorted array, membership is tested by
+    binary search:
+
+        known = ObjectIdSet(x['r_object_id'] for x in session.query(...))
+        missing = [x for x in scan if x not in known]
+
+    Bulk loads should go through constructor or update(), add() moves
+    the tail of array on each call.
+    """
+
+    def __init__(self, values=None):
+        super(ObjectIdSet, self).__init__()
+        if values is not None:
+            self.update(values)
+
+    def add(self, value):
+        value = _to_long(value)
+        index = bisect_left(self.values, value)
+        if index == len(self.values) or self.values[index] != value:
+            self.values.insert(index, value)
+
+    def update(self, values):
+        values = set(_to_long(value) for value in values)
+        values.update(self.values)
+        self.values = _storage(sorted(values))
+
+    def append(self, value):
+        self.add(value)
+
+    def extend(self, values):
+        self.update(values)
+
+    def __contains__(self, value):
+        value = _to_long(value)
+        index = bisect_left(self.values, value)
+        return index < len(self.values) and self.values[index] == value
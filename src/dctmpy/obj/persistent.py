@@ -5,6 +5,7 @@
 
 from dctmpy import *
 from dctmpy.obj import *
+from dctmpy.obj.objectid import ObjectId
 from dctmpy.obj.typedobject import TypedObject
 
 
@@ -30,9 +31,12 @@ class PersistentProxy(TypedObject):
         return TAG_CLASS_MAPPING.get(self._get_type_id(), Persistent)
 
     def _get_type_id(self):
-        if is_empty(self[R_OBJECT_ID]):
+        object_id = self[R_OBJECT_ID]
+        if isinstance(object_id, ObjectId):
+            return object_id.tag
+        if is_empty(object_id):
             return 0
-        return int(self[R_OBJECT_ID][:2], 16)
+        return int(object_id[:2], 16)
 
 
 class Persistent(PersistentProxy):
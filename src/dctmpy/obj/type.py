@@ -19,14 +19,14 @@ class TypeObject(TypedObject):
             for i in xrange(0, self._type_count):
                 type_info = self._deserialize_child_type()
         else:
-            while not is_empty(self.buffer()):
+            while not self._is_empty():
                 type_info = self._deserialize_child_type()
         self.type = type_info
 
     def _deserialize_child_type(self):
         child_type = self._read_type()
         if child_type is not None:
-            add_type_to_cache(child_type)
+            add_type_to_cache(getattr(self.session, 'docbaseid', None), child_type)
         return child_type
 
     def _read_type(self):
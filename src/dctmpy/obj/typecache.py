@@ -1,19 +1,97 @@
+import json
+import logging
+import os
+import threading
+
+
 class TypeCache:
     class __impl:
 
         def __init__(self):
             self.__cache = {}
+            self.__data = {}
+            self.__path = None
+            self.__loaded = True
+            self.__lock = threading.RLock()
 
-        def get(self, name):
-            if name in self.__cache:
-                return self.__cache.get(name)
-            return None
+        def get(self, docbaseid, name):
+            return self.__cache.get((docbaseid, name), None)
 
-        def add(self, typeInfo):
+        def add(self, docbaseid, typeInfo):
             superType = typeInfo.super
-            if superType in self.__cache and superType != "NULL":
-                typeInfo.extend(self.get(superType))
-            self.__cache[typeInfo.name] = typeInfo
+            if superType and superType != "NULL":
+                parent = self.get(docbaseid, superType)
+                if parent is not None:
+                    typeInfo.extend(parent)
+            self.__cache[(docbaseid, typeInfo.name)] = typeInfo
+
+        def persist(self, path):
+            with self.__lock:
+                if path == self.__path:
+                    return
+                self.__path = path
+                self.__loaded = path is None
+
+        def get_data(self, docbaseid, name, ser_version):
+            with self.__lock:
+                self.__load()
+                entry = self.__data.get((docbaseid, name), None)
+            if entry is None or entry[0] != ser_version:
+                return None
+            return entry[1]
+
+        def add_data(self, docbaseid, name, ser_version, data):
+            with self.__lock:
+                self.__load()
+                self.__data[(docbaseid, name)] = (ser_version, data)
+                if self.__path is None:
+                    return
+                try:
+                    with open(self.__path, 'ab') as f:
+                        f.write(self.__dump(docbaseid, name, ser_version, data))
+                except Exception, e:
+                    logging.warning("Unable to write type cache %s: %s" % (self.__path, e))
+
+        def __load(self):
+            if self.__loaded:
+                return
+            self.__loaded = True
+            lines = 0
+            try:
+                if not os.path.exists(self.__path):
+                    return
+                with open(self.__path, 'rb') as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        data = entry['data'].encode('latin-1')
+                        self.__data[(entry['docbaseid'], str(entry['name']))] = (entry['ser_version'], data)
+                        lines += 1
+            except Exception, e:
+                logging.warning("Unable to read type cache %s: %s" % (self.__path, e))
+                return
+            # revalidated types are appended, drop superseded entries
+            if lines > 2 * len(self.__data):
+                self.__compact()
+
+        def __compact(self):
+            temp = "%s.%d" % (self.__path, os.getpid())
+            try:
+                with open(temp, 'wb') as f:
+                    for ((docbaseid, name), (ser_version, data)) in self.__data.items():
+                        f.write(self.__dump(docbaseid, name, ser_version, data))
+                if os.name == 'nt':
+                    os.remove(self.__path)
+                os.rename(temp, self.__path)
+            except Exception, e:
+                logging.warning("Unable to write type cache %s: %s" % (self.__path, e))
+
+        def __dump(self, docbaseid, name, ser_version, data):
+            return json.dumps({
+                'docbaseid': docbaseid,
+                'name': name,
+                'ser_version': ser_version,
+                'data': str(data).decode('latin-1'),
+            }) + "\n"
 
     __instance = None
 
@@ -22,8 +100,21 @@ class TypeCache:
             TypeCache.__instance = TypeCache.__impl()
         self.__dict__['_TypeCache__instance'] = TypeCache.__instance
 
-    def get(self, typeName):
-        return self.__instance.get(typeName)
+    def get(self, docbaseid, typeName):
+        return self.__instance.get(docbaseid, typeName)
+
+    def add(self, docbaseid, typeObj):
+        return self.__instance.add(docbaseid, typeObj)
+
+    def persist(self, path):
+        """
+        Keeps FETCH_TYPE results in given file, so types are read from
+        it by new processes instead of being fetched again
+        """
+        return self.__instance.persist(path)
+
+    def get_data(self, docbaseid, typeName, ser_version):
+        return self.__instance.get_data(docbaseid, typeName, ser_version)
 
-    def add(self, typeObj):
-        return self.__instance.add(typeObj)
+    def add_data(self, docbaseid, typeName, ser_version, data):
+        return self.__instance.add_data(docbaseid, typeName, ser_version, data)
@@ -7,12 +7,19 @@ from decimal import Decimal
 from dctmpy import *
 from dctmpy.exceptions import ParserException
 from dctmpy.obj.attrinfo import AttrInfo
-from dctmpy.obj.attrvalue import AttrValue
+from dctmpy.obj.attrvalue import AttrValue, LazyAttrValue
+from dctmpy.obj.objectid import ObjectId
 from dctmpy.obj.typeinfo import TypeInfo
 
+TOKEN_PATTERN = re.compile(r'(\S*)\s*')
+SPACES_PATTERN = re.compile(r'\s*')
+ATTR_HEADER_PATTERN = re.compile(r'(\S+)\s+([RS])\s+(\d+)\s*')
+STRING_HEADER_PATTERN = re.compile(r'(\S+)\s+(\d+)\s?')
+
 
 class TypedObject(object):
-    attributes = ['session', 'type', 'buffer', 'initial', 'ser_version', 'iso8601time', 'attrs']
+    attributes = ['session', 'type', 'buffer', 'offset', 'initial', 'ser_version', 'iso8601time',
+                  'validate', 'attrs', 'lazy', 'projection', 'floats', 'compact_ids', 'strings']
 
     def __init__(self, **kwargs):
         for attribute in TypedObject.attributes:
@@ -21,6 +28,24 @@ class TypedObject(object):
         if self.attrs is None:
             self.attrs = {}
 
+        if self.offset is None:
+            self.offset = 0
+
+        if self.validate is None:
+            self.validate = getattr(self.session, 'validate', True)
+
+        if self.lazy is None:
+            self.lazy = getattr(self.session, 'lazy', False)
+
+        if self.projection is not None:
+            self.projection = frozenset(self.projection)
+
+        if self.floats is None:
+            self.floats = getattr(self.session, 'floats', False)
+
+        if self.compact_ids is None:
+            self.compact_ids = getattr(self.session, 'compact_ids', False)
+
         if self.ser_version is None:
             self.ser_version = self.session.ser_version
 
@@ -34,13 +59,14 @@ class TypedObject(object):
             self._read()
 
     def _is_empty(self):
-        return is_empty(self.buffer)
+        return self.buffer is None or self.offset >= len(self.buffer)
 
     def _read(self, buf=None):
-        if is_empty(buf) and is_empty(self.buffer):
+        if is_empty(buf) and self._is_empty():
             raise ParserException("Empty data")
         elif not is_empty(buf):
             self.buffer = buf
+            self.offset = 0
         self.initial = self.buffer
         self._read_header()
         if self.type is None and self._need_read_type():
@@ -85,48 +111,80 @@ class TypedObject(object):
         if self.type is None or type_name != self.type.name:
             raise ParserException("No type info for %s" % type_name)
 
+        decoders = self.type.decoders(READERS)
         for i in xrange(0, self._read_int()):
-            self._read_attr(i)
+            self._read_attr(i, decoders)
 
         self._read_extended_attr()
 
-    def _read_attr(self, index):
-        position = self._if_d6(self._read_base64_int)
-        if position is None:
+    def _read_attr(self, index, decoders=None):
+        if self.ser_version == 2 and (self.lazy or self.projection is not None):
+            return self._read_selective_attr(decoders)
+
+        if self.ser_version > 0:
+            position = self._read_base64_int()
+        else:
             position = index
 
-        repeating = self.type.get(position).repeating
-        attr_type = self.type.get(position).type
+        if decoders is None:
+            decoders = self.type.decoders(READERS)
+
+        (attr_name, attr_type, repeating, attr_length, reader) = decoders[position]
 
         if self.ser_version == 2:
             repeating = self._next_string(REPEATING_PATTERN) == REPEATING
             entry_type = self._read_int()
-            if entry_type in TYPES:
+            if entry_type in TYPES and TYPES[entry_type] != attr_type:
                 attr_type = TYPES[entry_type]
-
-        attr_name = self.type.get(position).name
-        attr_length = self.type.get(position).length
+                reader = READERS[attr_type]
 
         if not attr_type:
             raise ParserException("Unknown type")
 
-        result = []
+        if self.projection is not None and attr_name not in self.projection:
+            self._skip_values(attr_type, repeating)
+            return
+
+        if self.lazy:
+            self.add(LazyAttrValue(attr_name, attr_type, attr_length, repeating, False,
+                                   self, self._skip_values(attr_type, repeating), reader))
+            return
 
         if not repeating:
-            result.append(self._read_attr_value(attr_type))
+            result = reader(self)
         else:
-            for i in xrange(0, self._read_int()):
-                result.append(self._read_attr_value(attr_type))
-
-        self.add(AttrValue(**{
-            'name': attr_name,
-            'position': position,
-            'type': attr_type,
-            'length': attr_length,
-            'values': result,
-            'repeating': repeating,
-            'extended': False,
-        }))
+            result = [reader(self) for i in xrange(0, self._read_int())]
+
+        self._add_attr_value(attr_name, attr_type, attr_length, result, repeating, False)
+
+    def _read_selective_attr(self, decoders):
+        match = ATTR_HEADER_PATTERN.match(self.buffer, self.offset)
+        if match is None:
+            raise ParserException("Invalid attribute header at %d" % self.offset)
+        if decoders is None:
+            decoders = self.type.decoders(READERS)
+
+        (attr_name, attr_type, repeating, attr_length, reader) = decoders[pseudo_base64_to_int(match.group(1))]
+        repeating = match.group(2) == REPEATING
+        entry_type = int(match.group(3))
+        if entry_type in TYPES and TYPES[entry_type] != attr_type:
+            attr_type = TYPES[entry_type]
+            reader = READERS[attr_type]
+
+        if not attr_type:
+            raise ParserException("Unknown type")
+
+        self.offset = match.end()
+        if self.projection is not None and attr_name not in self.projection:
+            self._skip_values(attr_type, repeating)
+        elif self.lazy:
+            self.attrs[attr_name] = LazyAttrValue(attr_name, attr_type, attr_length, repeating, False,
+                                                  self, self._skip_values(attr_type, repeating), reader)
+        elif not repeating:
+            self._add_attr_value(attr_name, attr_type, attr_length, reader(self), repeating, False)
+        else:
+            result = [reader(self) for i in xrange(0, self._read_int())]
+            self._add_attr_value(attr_name, attr_type, attr_length, result, repeating, False)
 
     def add(self, value):
         self.attrs[value.name] = value
@@ -196,41 +254,83 @@ class TypedObject(object):
     def _read_extended_attr(self):
         attr_count = self._read_int()
         for i in xrange(0, attr_count):
-            attr_name = self._next_string(ATTRIBUTE_PATTERN)
-            attr_type = self._next_string(ATTRIBUTE_PATTERN)
+            # extended attributes are not known to type info, names and
+            # types are interned to avoid a copy per record
+            attr_name = intern(self._next_string(ATTRIBUTE_PATTERN))
+            attr_type = intern(self._next_string(ATTRIBUTE_PATTERN))
             repeating = REPEATING == self._next_string()
             length = self._read_int()
 
             if is_empty(attr_type):
                 raise ParserException("Unknown typedef: %s" % attr_type)
 
-            result = []
+            if self.projection is not None and attr_name not in self.projection:
+                self._skip_values(attr_type, repeating)
+                continue
+
+            if self.lazy and attr_type in READERS:
+                self.attrs[attr_name] = LazyAttrValue(attr_name, attr_type, length, repeating, True,
+                                                      self, self._skip_values(attr_type, repeating),
+                                                      READERS[attr_type])
+                continue
 
             if not repeating:
-                result.append(self._read_attr_value(attr_type))
+                result = self._read_attr_value(attr_type)
             else:
-                for i in xrange(0, self._read_int()):
-                    result.append(self._read_attr_value(attr_type))
-
-            self.attrs[attr_name] = AttrValue(**{
-                'name': attr_name,
-                'type': attr_type,
-                'length': length,
-                'values': result,
-                'repeating': repeating,
-                'extended': True,
-            })
+                result = [self._read_attr_value(attr_type) for i in xrange(0, self._read_int())]
+
+            self._add_attr_value(attr_name, attr_type, length, result, repeating, True)
+
+    def _add_attr_value(self, name, attr_type, length, values, repeating, extended):
+        # values of single attributes are passed as is, not wrapped into list
+        value = AttrValue(name, attr_type, length, repeating, values, extended)
+        if extended:
+            self.attrs[name] = value
+        else:
+            self.add(value)
 
     def _read_attr_value(self, attr_type):
-        return {
-            INT: TypedObject._read_int,
-            STRING: TypedObject._read_string,
-            TIME: TypedObject._read_time,
-            BOOL: TypedObject._read_boolean,
-            ID: TypedObject._next_string,
-            DOUBLE: TypedObject._read_double,
-            UNDEFINED: TypedObject._next_string
-        }[attr_type](self)
+        return READERS[attr_type](self)
+
+    def _skip_values(self, attr_type, repeating):
+        """
+        Moves past values of attribute without decoding them, returns
+        offset the values start at
+        """
+        offset = self.offset
+        skip = SKIPPERS.get(attr_type, TypedObject._skip_token)
+        if not repeating:
+            skip(self)
+        else:
+            for i in xrange(0, self._read_int()):
+                skip(self)
+        return offset
+
+    def _read_lazy(self, offset, reader, repeating):
+        saved = self.offset
+        self.offset = offset
+        try:
+            if not repeating:
+                return reader(self)
+            return [reader(self) for i in xrange(0, self._read_int())]
+        finally:
+            self.offset = saved
+
+    def _skip_token(self):
+        self.offset = TOKEN_PATTERN.match(self.buffer, self.offset).end()
+
+    def _skip_string(self):
+        match = STRING_HEADER_PATTERN.match(self.buffer, self.offset)
+        if match is None:
+            raise ParserException("Invalid string at %d" % self.offset)
+        length = int(match.group(2))
+        if match.group(1) == 'H':
+            length *= 2
+        self.offset = SPACES_PATTERN.match(self.buffer, match.end() + length).end()
+
+    def _skip_time(self):
+        if self._next_token() == "xxx":
+            self.offset = SPACES_PATTERN.match(self.buffer, self.offset + 20).end()
 
     def _read_type_info(self):
         return TypeInfo(**{
@@ -262,43 +362,25 @@ class TypedObject(object):
         return default
 
     def serialize(self):
-        result = ""
+        chunks = []
         if self.ser_version > 0:
-            result += "%d\n" % self.ser_version
-        result += "OBJ NULL 0 "
+            chunks.append("%d\n" % self.ser_version)
+        chunks.append("OBJ NULL 0 ")
         if self.ser_version > 0:
-            result += "0 0\n0\n"
-        result += "%d\n" % len(self.attrs)
-        for attr_value in self.attrs.values():
-            result += "%s %s %s %d\n" % (
-                attr_value.name, attr_value.type, [SINGLE, REPEATING][attr_value.repeating],
-                attr_value.length)
+            chunks.append("0 0\n0\n")
+        chunks.append("%d\n" % len(self.attrs))
+        for attr_value in self.attrs.itervalues():
+            formatter = FORMATTERS.get(attr_value.type, _format_value)
+            values = attr_value.values
             if attr_value.repeating:
-                result += "%d\n" % len(attr_value.values)
-            for value in attr_value.values:
-                if STRING == attr_value.type:
-                    if value is None:
-                        value = ""
-                    result += "A %d %s\n" % (len(value), value)
-                elif ID == attr_value.type:
-                    if is_empty(value):
-                        value = NULL_ID
-                    result += "%s\n" % value
-                elif BOOL == attr_value.type:
-                    if value is None:
-                        value = False
-                    result += "%s\n" % ["F", "T"][value]
-                elif INT == attr_value.type or DOUBLE == attr_value.type:
-                    if value is None:
-                        value = 0
-                    result += "%s\n" % value
-                elif TIME == attr_value.type:
-                    if value is None:
-                        value = "nulldate"
-                    result += "%s\n" % value
-                else:
-                    result += "%s\n" % value
-        return result
+                chunks.append("%s %s %s %d\n%d\n" % (
+                    attr_value.name, attr_value.type, REPEATING, attr_value.length, len(values)))
+                chunks.extend(map(formatter, values))
+            else:
+                # single attribute always has a value line, null one if unset
+                chunks.append("%s %s %s %d\n%s" % (
+                    attr_value.name, attr_value.type, SINGLE, attr_value.length, formatter(values[0])))
+        return "".join(chunks)
 
     def _need_read_type(self):
         return True
@@ -307,26 +389,28 @@ class TypedObject(object):
         return True
 
     def _substr(self, length, trim=-1):
-        result = str(buffer(self.buffer, 0, length))
-        for c in buffer(self.buffer, length):
-            if trim == 0 or not c.isspace():
-                break
-            length += 1
-            trim -= 1
-        self.buffer = buffer(self.buffer, length)
+        start = self.offset
+        stop = start + length
+        result = str(self.buffer[start:stop])
+        if trim < 0:
+            stop = SPACES_PATTERN.match(self.buffer, stop).end()
+        else:
+            end = min(stop + trim, len(self.buffer))
+            while stop < end and self.buffer[stop:stop + 1].isspace():
+                stop += 1
+        self.offset = stop
         return result
 
     def _next_token(self, trim=-1):
-        length = 0
-        for c in self.buffer:
-            if c.isspace():
-                break
-            length += 1
-        return self._substr(length, trim)
+        match = TOKEN_PATTERN.match(self.buffer, self.offset)
+        if trim < 0:
+            self.offset = match.end()
+            return match.group(1)
+        return self._substr(match.end(1) - self.offset, trim)
 
     def _next_string(self, pattern=None, trim=-1):
         value = self._next_token(trim)
-        if pattern:
+        if pattern and self.validate:
             if not pattern.match(value):
                 raise ParserException("Invalid string: %s for regexp %s" % (value, pattern))
         return value
@@ -344,20 +428,29 @@ class TypedObject(object):
             length *= 2
         result = self._substr(length)
         if encoding == 'H':
-            return result.decode("hex")
+            result = result.decode("hex")
+        if self.strings is not None:
+            return self.strings.intern(result)
         return result
 
     def _read_time(self):
         value = self._next_token()
         if value == "xxx":
             value = self._substr(20)
-        return parse_time(value)
+        return getattr(self.session, 'time_parser', TIME_PARSER).parse(value)
 
     def _read_boolean(self):
         value = self._next_string(BOOLEAN_PATTERN)
         return value == 'T' or value == '1'
 
+    def _read_id(self):
+        if self.compact_ids:
+            return ObjectId(self._next_token())
+        return self._next_token()
+
     def _read_double(self):
+        if self.floats:
+            return float(self._next_string())
         return Decimal(self._next_string())
 
     def __len__(self):
@@ -415,3 +508,69 @@ class TypedObject(object):
         if len(extended) == 0:
             return "ATTRIBUTES:%s" % primary
         return "ATTRIBUTES:%s\nEXTENDED:%s" % (primary, extended)
+
+
+READERS = {
+    INT: TypedObject._read_int,
+    STRING: TypedObject._read_string,
+    TIME: TypedObject._read_time,
+    BOOL: TypedObject._read_boolean,
+    ID: TypedObject._read_id,
+    DOUBLE: TypedObject._read_double,
+    UNDEFINED: TypedObject._next_string
+}
+
+def _format_string(value):
+    if value is None:
+        value = ""
+    return "A %d %s\n" % (len(value), value)
+
+
+def _format_id(value):
+    if not value:
+        value = NULL_ID
+    return "%s\n" % value
+
+
+def _format_boolean(value):
+    if value:
+        return "T\n"
+    return "F\n"
+
+
+def _format_number(value):
+    if value is None:
+        value = 0
+    return "%s\n" % value
+
+
+def _format_double(value):
+    if isinstance(value, float):
+        # str() keeps 12 significant digits only
+        return "%r\n" % value
+    return _format_number(value)
+
+
+def _format_time(value):
+    if value is None:
+        value = "nulldate"
+    return "%s\n" % value
+
+
+def _format_value(value):
+    return "%s\n" % value
+
+
+FORMATTERS = {
+    STRING: _format_string,
+    ID: _format_id,
+    BOOL: _format_boolean,
+    INT: _format_number,
+    DOUBLE: _format_double,
+    TIME: _format_time,
+}
+
+SKIPPERS = {
+    STRING: TypedObject._skip_string,
+    TIME: TypedObject._skip_time,
+}
@@ -1,11 +1,21 @@
 class TypeInfo(object):
-    attributes = ['name', 'id', 'vstamp', 'version', 'cache', 'super',
-                  'shared_parent', 'aspect_name', 'aspect_share_flag',
-                  'ser_version', 'attrs', 'positions', 'pending']
+    __slots__ = ('name', 'id', 'vstamp', 'version', 'cache', 'super',
+                 'shared_parent', 'aspect_name', 'aspect_share_flag',
+                 'ser_version', 'attrs', 'positions', 'pending', 'plan')
 
-    def __init__(self, **kwargs):
-        for attribute in TypeInfo.attributes:
-            setattr(self, attribute, kwargs.pop(attribute, None))
+    def __init__(self, name=None, id=None, vstamp=None, version=None, cache=None, super=None,
+                 shared_parent=None, aspect_name=None, aspect_share_flag=None, ser_version=None):
+        self.name = name
+        self.id = id
+        self.vstamp = vstamp
+        self.version = version
+        self.cache = cache
+        self.super = super
+        self.shared_parent = shared_parent
+        self.aspect_name = aspect_name
+        self.aspect_share_flag = aspect_share_flag
+        self.ser_version = ser_version
+        self.plan = None
         if self.super == 'NULL':
             self.super = None
         if self.shared_parent == 'NULL':
@@ -17,6 +27,7 @@ class TypeInfo(object):
         self.positions = {}
 
     def append(self, attr_info):
+        self.plan = None
         self.attrs.append(attr_info)
         if self.ser_version <= 0:
             return
@@ -26,6 +37,7 @@ class TypeInfo(object):
             raise RuntimeError("Empty position")
 
     def insert(self, index, attr_info):
+        self.plan = None
         self.attrs.insert(index, attr_info)
         if self.ser_version <= 0:
             return
@@ -41,6 +53,23 @@ class TypeInfo(object):
                 return self.positions[index]
         return self.attrs[index]
 
+    def decoders(self, readers):
+        """
+        Returns decoding plan for objects of this type: (name, type,
+        repeating, length, reader) tuples keyed the same way as get(),
+        reader being taken from readers by attribute type. Plan is built
+        once and dropped whenever attributes are added.
+        """
+        if self.plan is None:
+            plan = {}
+            for index, attr_info in enumerate(self.attrs):
+                if self.ser_version > 0 and not self.is_generated():
+                    index = attr_info.position
+                plan[index] = (attr_info.name, attr_info.type, attr_info.repeating,
+                               attr_info.length, readers.get(attr_info.type))
+            self.plan = plan
+        return self.plan
+
     def count(self):
         return len(self.attrs)
 
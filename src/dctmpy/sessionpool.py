@@ -0,0 +1,216 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from dctmpy.docbaseclient import DocbaseClient
+from dctmpy.obj.objectcache import ObjectCache
+from dctmpy.exceptions import ProtocolException
+
+DEFAULT_MIN_SIZE = 0
+DEFAULT_MAX_SIZE = 10
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_MAX_LIFETIME = 3600
+
+
+class SessionPool(object):
+    """
+    Thread-safe pool of authenticated DocbaseClient sessions. Keyword
+    arguments not listed in attributes are passed to DocbaseClient.
+
+    Sessions idle for more than idle_timeout seconds (beyond min_size)
+    or older than max_lifetime seconds are disconnected, idle sessions
+    are checked by TIME RPC before being handed out when validate is
+    set. checkout() blocks up to timeout seconds (forever if None)
+    when all max_size sessions are in use. Pooled sessions share single
+    object_cache, object_cache=True creates default ObjectCache.
+    """
+
+    attributes = ['min_size', 'max_size', 'idle_timeout', 'max_lifetime', 'timeout', 'validate']
+
+    def __init__(self, **kwargs):
+        for attribute in SessionPool.attributes:
+            setattr(self, attribute, kwargs.pop(attribute, None))
+        if self.min_size is None:
+            self.min_size = DEFAULT_MIN_SIZE
+        if self.max_size is None:
+            self.max_size = DEFAULT_MAX_SIZE
+        if self.idle_timeout is None:
+            self.idle_timeout = DEFAULT_IDLE_TIMEOUT
+        if self.max_lifetime is None:
+            self.max_lifetime = DEFAULT_MAX_LIFETIME
+        if self.validate is None:
+            self.validate = True
+        if not 0 <= self.min_size <= self.max_size or self.max_size < 1:
+            raise RuntimeError("Invalid pool size: min %d, max %d" % (self.min_size, self.max_size))
+        if kwargs.get('object_cache') is True:
+            kwargs['object_cache'] = ObjectCache()
+        self.object_cache = kwargs.get('object_cache')
+        self.options = kwargs
+        self.condition = threading.Condition()
+        # (session, released) pairs, most recently released on the right
+        self.idle = deque()
+        self.created = {}
+        self.size = 0
+        self.closed = False
+
+        for i in xrange(0, self.min_size):
+            self.size += 1
+            self._release_idle(self._create())
+
+    def _create(self):
+        try:
+            session = DocbaseClient(**dict(self.options))
+        except:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        self.created[session] = time.time()
+        return session
+
+    def _release_idle(self, session):
+        with self.condition:
+            self.idle.append((session, time.time()))
+            self.condition.notify()
+
+    def _expired(self, session, released, now):
+        if self.max_lifetime and now - self.created.get(session, now) > self.max_lifetime:
+            return True
+        if self.idle_timeout and now - released > self.idle_timeout:
+            return self.size > self.min_size
+        return False
+
+    def _is_usable(self, session):
+        if not session.session or not session._connected():
+            return False
+        if not self.validate:
+            return True
+        try:
+            session.time()
+            return True
+        except Exception, e:
+            logging.debug("Pooled session failed validation: %s" % e)
+            return False
+
+    def _dispose(self, session):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+        self._disconnect(session)
+
+    def _disconnect(self, session):
+        self.created.pop(session, None)
+        try:
+            session.disconnect()
+        except Exception, e:
+            logging.debug("Unable to disconnect pooled session: %s" % e)
+
+    def _acquire(self, deadline):
+        """
+        Returns an idle session or None if caller may create a new one,
+        the second element lists expired idle sessions which are already
+        removed from the pool but still need to be disconnected
+        """
+        expired = []
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise RuntimeError("Session pool is closed")
+                now = time.time()
+                while self.idle and self._expired(self.idle[0][0], self.idle[0][1], now):
+                    expired.append(self.idle.popleft()[0])
+                    self.size -= 1
+                while self.idle:
+                    (session, released) = self.idle.pop()
+                    if not self._expired(session, released, now):
+                        return session, expired
+                    expired.append(session)
+                    self.size -= 1
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None, expired
+                if deadline is None:
+                    self.condition.wait()
+                    continue
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise RuntimeError("Timed out waiting for session, %d sessions in use" % self.size)
+                self.condition.wait(remaining)
+
+    def checkout(self, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while True:
+            session, expired = self._acquire(deadline)
+            for stale in expired:
+                self._disconnect(stale)
+            if session is None:
+                return self._create()
+            if self._is_usable(session):
+                return session
+            self._dispose(session)
+
+    def checkin(self, session, broken=False):
+        """
+        Returns session to the pool, collections left open are closed
+        first. Broken sessions, sessions which lost their socket or
+        outlived max_lifetime and sessions returned to closed pool are
+        disconnected.
+        """
+        if not broken:
+            try:
+                for collection in session.collections.values():
+                    collection.close()
+                broken = len(session.collections) > 0 or len(session.pending) > 0
+            except Exception, e:
+                logging.debug("Unable to close collections of pooled session: %s" % e)
+                broken = True
+        now = time.time()
+        if broken or self.closed or self._expired(session, now, now) \
+                or not session.session or not session._connected():
+            self._dispose(session)
+        else:
+            self._release_idle(session)
+
+    @contextmanager
+    def session(self, timeout=None):
+        """
+        with pool.session() as session: ... checks session out and back
+        in, session is disposed if its connection failed meanwhile
+        """
+        session = self.checkout(timeout)
+        try:
+            yield session
+        except (socket.error, ProtocolException):
+            self.checkin(session, True)
+            raise
+        except:
+            self.checkin(session)
+            raise
+        self.checkin(session)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle = [session for (session, released) in self.idle]
+            self.idle.clear()
+            self.size -= len(idle)
+            self.condition.notify_all()
+        for session in idle:
+            self._disconnect(session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,218 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import socket
+import threading
+
+from dctmpy import *
+from dctmpy.docbaseclient import DocbaseClient
+from dctmpy.net import PROTOCOL_VERSION, read_integer, serialize_integer, serialize_value, join_segments
+from dctmpy.net.frame import FrameReader, HEADER_SIZE
+from dctmpy.net.response import Response
+from dctmpy.obj.attrinfo import AttrInfo
+from dctmpy.obj.typeinfo import TypeInfo
+
+SESSION_ID = "0100000180000001"
+
+ENTRY_POINTS = {'FETCH': 1, 'FETCH_TYPE': 2}
+
+
+class FakeServer(object):
+    """
+    Docbase server stub on the other end of socketpair: every request is
+    answered with handler(rpc, args), which returns data argument of the
+    response (list of strings for response split into continuation
+    pieces) and the integers following it, non-zero status of response
+    goes third. As real server does, pieces not asked for by
+    RPC_GET_NEXT_PIECE are dropped by the next request.
+    """
+
+    def __init__(self, handler):
+        (self.client, self.server) = socket.socketpair()
+        self.handler = handler
+        self.rpcs = []
+        self.pieces = []
+        self.dropped = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        for sock in (self.client, self.server):
+            try:
+                sock.close()
+            except:
+                pass
+        self.thread.join(5)
+
+    def _serve(self):
+        try:
+            while True:
+                message = self._read_message()
+                if message is None:
+                    return
+                (sequence, rpc, args) = _parse_request(message)
+                self.rpcs.append(rpc)
+                self.server.sendall(str(self._answer(sequence, rpc, args)))
+        except socket.error:
+            pass
+        except Exception, e:
+            self.error = e
+            self.server.close()
+
+    def _answer(self, sequence, rpc, args):
+        if rpc == RPC_GET_NEXT_PIECE:
+            if not self.pieces:
+                return frame(sequence, ["", 0])
+            piece = self.pieces.pop(0)
+            return frame(sequence, [piece, [0, 1][len(self.pieces) > 0]])
+        if self.pieces:
+            self.pieces = []
+            self.dropped += 1
+        reply = self.handler(rpc, args)
+        (data, results) = reply[:2]
+        if len(reply) > 2:
+            # failure of the whole request
+            return frame(sequence, [], reply[2])
+        oob = 0
+        if isinstance(data, list):
+            self.pieces = data[1:]
+            data = data[0]
+            if self.pieces:
+                oob = 0x10
+        return frame(sequence, [data] + list(results) + [oob])
+
+    def _read_message(self):
+        header = self._read(HEADER_SIZE)
+        if header is None:
+            return None
+        length = 0
+        for x in bytearray(header):
+            length = (length << 8) | x
+        return self._read(length)
+
+    def _read(self, length):
+        result = ""
+        while len(result) < length:
+            chunk = self.server.recv(length - len(result))
+            if not chunk:
+                return None
+            result += chunk
+        return result
+
+
+class Client(DocbaseClient):
+    """
+    DocbaseClient connected to FakeServer, session is not opened
+    """
+
+    def _open(self):
+        pass
+
+
+def connect(server, **kwargs):
+    client = Client(**dict({
+        'docbaseid': 1,
+        'session': SESSION_ID,
+        'entrypoints': ENTRY_POINTS,
+    }, **kwargs))
+    client.socket = server.client
+    client.reader = FrameReader(client.socket)
+    return client
+
+
+def frame(sequence, items, status=0):
+    header = bytearray([PROTOCOL_VERSION, 0])
+    header.extend(serialize_integer(sequence))
+    header.extend(serialize_integer(status))
+    header[1] = len(header) - 2
+    payload = join_segments([header] + [serialize_value(x) for x in items])
+    length = len(payload)
+    return bytearray([(length >> 24) & 0xff, (length >> 16) & 0xff, (length >> 8) & 0xff, length & 0xff]) + payload
+
+
+def _parse_request(message):
+    message = bytearray(message)
+    (sequence, offset) = read_integer(message, 2)
+    (rpc, offset) = read_integer(message, offset)
+    response = Response(message=message, offset=2 + message[1])
+    args = []
+    while True:
+        arg = response.next()
+        if arg is None:
+            break
+        if isinstance(arg, buffer):
+            arg = str(arg)
+        args.append(arg)
+    return sequence, rpc, args
+
+
+def document_type():
+    result = TypeInfo(name='dm_document', id=NULL_ID, vstamp=0, version=0, cache=0, super='NULL', ser_version=2)
+    for (position, (name, attr_type, repeating)) in enumerate(DOCUMENT_ATTRS):
+        result.append(AttrInfo(position=position, name=name, type=attr_type, repeating=repeating, length=32,
+                               restriction=0))
+    return result
+
+
+DOCUMENT_ATTRS = [
+    ('r_object_id', 'ID', False),
+    ('object_name', 'STRING', False),
+    ('r_version_label', 'STRING', True),
+    ('r_content_size', 'INT', False),
+]
+
+TYPE_NUMBERS = {'BOOL': 0, 'INT': 1, 'STRING': 2, 'ID': 3, 'TIME': 4, 'DOUBLE': 5}
+
+
+def document_id(number):
+    return "09000001%08x" % number
+
+
+def document_entry(number):
+    """
+    Collection record of dm_document in ser_version 2 format
+    """
+    return _document(number) + "0\n"
+
+
+def document_object(number):
+    """
+    dm_document returned by FETCH in ser_version 2 format
+    """
+    return "2\ndm_document %s 0\n" % NULL_ID + _document(number)
+
+
+def _document(number):
+    values = [document_id(number), "doc %d" % number, ["1.0", "CURRENT"], number * 10]
+    lines = ["OBJ dm_document 0 0 0", str(len(DOCUMENT_ATTRS))]
+    for (position, ((name, attr_type, repeating), value)) in enumerate(zip(DOCUMENT_ATTRS, values)):
+        lines.append("%s %s %d" % (int_to_pseudo_base64(position), ["S", "R"][repeating], TYPE_NUMBERS[attr_type]))
+        if repeating:
+            lines.append(str(len(value)))
+            lines.extend(_format_value(attr_type, x) for x in value)
+        else:
+            lines.append(_format_value(attr_type, value))
+    lines.append("0")
+    return "\n".join(lines) + "\n"
+
+
+def document_batch(first, count):
+    return "2\n" + "".join(document_entry(x) for x in xrange(first, first + count))
+
+
+def split(data, count):
+    """
+    Splits data into count continuation pieces, cutting records in the
+    middle
+    """
+    size = len(data) // count + 1
+    return [data[x:x + size] for x in xrange(0, len(data), size)]
+
+
+def _format_value(attr_type, value):
+    if attr_type == 'STRING':
+        return "A %d %s" % (len(value), value)
+    return str(value)
@@ -0,0 +1,101 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import unittest
+
+from dctmpy import *
+from dctmpy.obj.collection import Collection
+from fakeserver import FakeServer, connect, document_type, document_batch, document_id, split
+
+
+class BatchServer(object):
+    """
+    Answers RPC_MULTI_NEXT with batches of given sizes, every batch is
+    split into given number of continuation pieces
+    """
+
+    def __init__(self, sizes, pieces=1):
+        self.sizes = list(sizes)
+        self.pieces = pieces
+        self.returned = 0
+
+    def __call__(self, rpc, args):
+        if rpc != RPC_MULTI_NEXT:
+            return "", []
+        if not self.sizes:
+            return "", [0, 0, 1]
+        count = self.sizes.pop(0)
+        data = split(document_batch(self.returned, count), self.pieces)
+        self.returned += count
+        return data, [count, [0, 1][len(self.sizes) > 0], 1]
+
+
+class CollectionTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for (client, server) in self.servers:
+            client.disconnect()
+            server.close()
+            self.assertEqual(server.error, None)
+
+    def open(self, sizes, pieces=1, **kwargs):
+        self.server = FakeServer(BatchServer(sizes, pieces))
+        self.servers.append((connect(self.server, ser_version=2, **kwargs), self.server))
+        return Collection(session=self.servers[-1][0], type=document_type(), collection=5, batch_size=20,
+                          persistent=False)
+
+    def assertRecords(self, records, count):
+        self.assertEqual([x['r_object_id'] for x in records], [document_id(x) for x in xrange(count)])
+        self.assertEqual([x['object_name'] for x in records], ["doc %d" % x for x in xrange(count)])
+        self.assertEqual(records[-1]['r_version_label'], ["1.0", "CURRENT"])
+        self.assertEqual(records[-1]['r_content_size'], (count - 1) * 10)
+
+    def assertPiecesRead(self):
+        self.assertEqual(self.server.dropped, 0)
+        # continuation is asked for right after the batch it belongs to
+        for (rpc, following) in zip(self.server.rpcs, self.server.rpcs[1:]):
+            if following == RPC_GET_NEXT_PIECE:
+                self.assertTrue(rpc in (RPC_MULTI_NEXT, RPC_GET_NEXT_PIECE))
+
+    def test_pieces(self):
+        records = list(self.open([7, 5, 3], pieces=3))
+        self.assertRecords(records, 15)
+        self.assertPiecesRead()
+
+    def test_pieces_prefetch(self):
+        for prefetch in (1, 2, 4):
+            records = list(self.open([7, 5, 3, 4], pieces=3, prefetch=prefetch))
+            self.assertRecords(records, 19)
+            self.assertPiecesRead()
+
+    def test_pieces_streaming(self):
+        records = list(self.open([7, 5, 3], pieces=4, streaming=True))
+        self.assertRecords(records, 15)
+        self.assertPiecesRead()
+
+    def test_streaming_close(self):
+        collection = self.open([7, 5], pieces=3, streaming=True)
+        self.assertEqual(collection.next_record()['r_object_id'], document_id(0))
+        collection.close()
+        self.assertEqual(self.server.rpcs[-1], RPC_CLOSE_COLLECTION)
+        self.assertPiecesRead()
+
+    def test_fetch_columns_pieces(self):
+        columns = self.open([7, 5], pieces=2, prefetch=2).fetch_columns(['r_object_id', 'r_content_size'])
+        self.assertEqual(list(columns['r_object_id']), [document_id(x) for x in xrange(12)])
+        self.assertEqual(list(columns['r_content_size']), [x * 10 for x in xrange(12)])
+        self.assertPiecesRead()
+
+    def test_close_prefetched(self):
+        collection = self.open([3, 3, 3], pieces=2, prefetch=2)
+        self.assertEqual(collection.next_record()['r_object_id'], document_id(0))
+        collection.close()
+        self.assertEqual(self.server.rpcs[-1], RPC_CLOSE_COLLECTION)
+        self.assertPiecesRead()
+
+
+if __name__ == '__main__':
+    unittest.main()
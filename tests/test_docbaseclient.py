@@ -0,0 +1,135 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import unittest
+
+from dctmpy import *
+from dctmpy.exceptions import ParserException, ProtocolException
+from dctmpy.obj.typecache import TypeCache
+from fakeserver import FakeServer, connect, document_type, document_object, document_id, split
+
+
+class FetchServer(object):
+    """
+    Answers FETCH with dm_document objects, objects with given numbers
+    fail, are split into continuation pieces, break parser or the
+    whole response
+    """
+
+    def __init__(self, failed=(), pieces=(), broken=(), bad_status=()):
+        self.failed = failed
+        self.pieces = pieces
+        self.broken = broken
+        self.bad_status = bad_status
+
+    def __call__(self, rpc, args):
+        if rpc != RPC_APPLY_FOR_OBJECT:
+            return "", []
+        number = int(args[2][8:], 16)
+        if number in self.failed:
+            return "", [0, 0]
+        if number in self.bad_status:
+            return "", [], 0x01
+        if number in self.broken:
+            return "2\ndm_document %s 0\nBROKEN" % NULL_ID, [1, 1]
+        if number in self.pieces:
+            return split(document_object(number), 3), [1, 1]
+        return document_object(number), [1, 1]
+
+
+class GetObjectsTest(unittest.TestCase):
+    def setUp(self):
+        add_type_to_cache(1, document_type())
+        self.servers = []
+
+    def tearDown(self):
+        for (client, server) in self.servers:
+            client.disconnect()
+            server.close()
+            self.assertEqual(server.error, None)
+
+    def connect(self, **kwargs):
+        self.server = FakeServer(FetchServer(**kwargs))
+        self.servers.append((connect(self.server, ser_version=2), self.server))
+        return self.servers[-1][0]
+
+    def assertObjects(self, objects, numbers):
+        self.assertEqual([x is not None and x['r_object_id'] for x in objects],
+                         [x is not None and document_id(x) for x in numbers])
+
+    def test_window(self):
+        client = self.connect()
+        objects = client.get_objects([document_id(x) for x in xrange(40)], window=8)
+        self.assertObjects(objects, xrange(40))
+        self.assertEqual(objects[-1]['r_version_label'], ["1.0", "CURRENT"])
+        self.assertEqual(len(client.pending), 0)
+
+    def test_server_error(self):
+        client = self.connect(failed=(5,))
+        objects = client.get_objects([document_id(x) for x in xrange(12)], window=8)
+        self.assertObjects(objects, [None if x == 5 else x for x in xrange(12)])
+        self.assertEqual(len(client.pending), 0)
+
+    def test_pieces(self):
+        client = self.connect(pieces=(3, 10, 11))
+        objects = client.get_objects([document_id(x) for x in xrange(12)], window=8)
+        self.assertObjects(objects, xrange(12))
+        self.assertEqual(objects[10]['r_content_size'], 100)
+
+    def test_parser_error(self):
+        client = self.connect(broken=(6,))
+        self.assertRaises(ParserException, client.get_objects, [document_id(x) for x in xrange(12)], None, 8)
+        # responses of the rest of window are not taken for later ones
+        self.assertEqual(len(client.pending), 0)
+        self.assertObjects(client.get_objects([document_id(20)]), [20])
+
+    def test_protocol_error(self):
+        client = self.connect(bad_status=(4,))
+        self.assertRaises(ProtocolException, client.get_objects, [document_id(x) for x in xrange(12)], None, 8)
+        self.assertEqual(len(client.pending), 0)
+        self.assertObjects(client.get_objects([document_id(20)]), [20])
+
+
+class TypeServer(object):
+    """
+    Answers RPC_FETCH_TYPE, types with given names are split into
+    continuation pieces
+    """
+
+    def __init__(self, pieces=()):
+        self.pieces = pieces
+
+    def __call__(self, rpc, args):
+        if rpc != RPC_FETCH_TYPE:
+            return "", []
+        name = args[1]
+        data = ("1\n0\nTYPE %s 0300000180000002 1 1 0 NULL NULL NULL F\n2\n"
+                "A a_name STRING S 32 0\nB a_count INT R 0 0\n") % name
+        if name in self.pieces:
+            return split(data, 3), [1]
+        return data, [1]
+
+
+class WarmUpTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer(TypeServer(pieces=('warm_up_2', 'warm_up_7')))
+        self.client = connect(self.server, docbaseid=2, ser_version=2, entrypoints={})
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.server.close()
+        self.assertEqual(self.server.error, None)
+
+    def test_pieces(self):
+        names = ['warm_up_%d' % x for x in xrange(10)]
+        self.client.warm_up_types(names, window=4)
+        for name in names:
+            type_info = TypeCache().get(2, name)
+            self.assertEqual(type_info.name, name)
+            self.assertEqual([x.name for x in type_info.attrs], ['a_name', 'a_count'])
+        self.assertEqual(len(self.client.pending), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import unittest
+
+from dctmpy.obj.docbroker import DocbaseMap
+
+HOST_ADDR = "INET_ADDR: 02 07e8 7f000001"
+
+DOCBASE_MAP = ("OBJ docbase_map 0\n7\n"
+               "i_host_addr STRING S 64\nA %d %s\n"
+               "r_docbase_name STRING R 32\n2\nA 4 repo\nA 5 other\n"
+               "r_docbase_id INT R 0\n2\n1\n2\n"
+               "r_host_name STRING S 32\nA 4 host\n"
+               "r_empty STRING R 32\n0\n"
+               "i_single INT S 0\n17\n"
+               "r_blank STRING S 32\nA 0 \n") % (len(HOST_ADDR), HOST_ADDR)
+
+
+class DocbaseMapTest(unittest.TestCase):
+    def test_values(self):
+        docbase_map = DocbaseMap(buffer=DOCBASE_MAP)
+        self.assertEqual(docbase_map['i_host_addr'], HOST_ADDR)
+        self.assertEqual(docbase_map['r_docbase_name'], ['repo', 'other'])
+        self.assertEqual(docbase_map['r_docbase_id'], [1, 2])
+        # all attributes but i_host_addr are turned into repeating ones
+        self.assertEqual(docbase_map['r_host_name'], ['host'])
+        self.assertEqual(docbase_map['i_single'], [17])
+        self.assertEqual(docbase_map['r_blank'], [''])
+        self.assertEqual(docbase_map['r_empty'], [])
+
+    def test_repeating(self):
+        docbase_map = DocbaseMap(buffer=DOCBASE_MAP)
+        self.assertFalse(docbase_map.attrs['i_host_addr'].repeating)
+        for name in ['r_docbase_name', 'r_docbase_id', 'r_host_name', 'r_empty', 'i_single', 'r_blank']:
+            self.assertTrue(docbase_map.attrs[name].repeating)
+        self.assertEqual(docbase_map.attrs['r_host_name'][0], 'host')
+        self.assertEqual(len(docbase_map.attrs['r_empty']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
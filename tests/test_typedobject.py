@@ -0,0 +1,55 @@
+# Copyright (c) 2013 Andrey B. Panfilov <andrew@panfilov.tel>
+#
+# See main module for license.
+#
+import unittest
+from decimal import Decimal
+
+from dctmpy.obj.typedobject import TypedObject
+
+DOUBLES = [0.1, 1 / 3.0, -2.5e17, 1e-300, 123456789.123456789, 2 ** 0.5, 0.0]
+
+
+class Session(object):
+    ser_version = 0
+    iso8601time = False
+
+
+class SerializeTest(unittest.TestCase):
+    def values(self, obj):
+        """
+        Lines following the header of the only attribute
+        """
+        return obj.serialize().splitlines()[2:]
+
+    def read_double(self, line, floats=True):
+        reader = TypedObject(session=Session(), floats=floats)
+        reader.buffer = line + "\n"
+        return reader._read_double()
+
+    def test_float_round_trip(self):
+        for value in DOUBLES:
+            obj = TypedObject(session=Session())
+            obj.set_double('value', value)
+            self.assertEqual([self.read_double(x) for x in self.values(obj)], [value])
+
+    def test_repeating_float_round_trip(self):
+        obj = TypedObject(session=Session())
+        obj.append_double('values', DOUBLES)
+        self.assertEqual([self.read_double(x) for x in self.values(obj)[1:]], DOUBLES)
+
+    def test_decimal(self):
+        obj = TypedObject(session=Session())
+        obj.set_double('value', Decimal('0.10000000000000000001'))
+        self.assertEqual(self.values(obj), ['0.10000000000000000001'])
+        self.assertEqual(self.read_double(self.values(obj)[0], False), Decimal('0.10000000000000000001'))
+
+    def test_null(self):
+        obj = TypedObject(session=Session())
+        obj.set_double('value', None)
+        obj.set_int('count', None)
+        self.assertEqual(obj.serialize().count("\n0\n"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()